@@ -3,19 +3,35 @@ from pathlib import Path, PosixPath
 import fire
 from typing import Optional, Union, List
 
-from .pages import LogseqPage
+from .pages import LogseqPage, read_page_properties, append_blocks
 from .blocks import LogseqBlock
+from .checks import set_check_level, get_check_level, CHECK_LEVELS
+from .prefilter import Prefilter, matches_prefilter
+from .snapshot import LogseqPageSnapshot, LogseqBlockSnapshot
+from .diff import LogseqPageDiff
+from .names import LogseqPageNameIndex, decode_page_name
+from .dates import LogseqDateIndex
+from .graph import LogseqGraph, LogseqPageProxy
+from .timeindex import LogseqTimeIndex
+from .search import LogseqSearchIndex
+from .anchoring import HighlightAnchorer, HighlightAnchor
+from .daemon import LogseqGraphDaemon
+from .store import LogseqSQLiteStore
+from .shared import LogseqSharedGraph, LogseqSharedPageView, LogseqSharedBlockView
 
 __VERSION__: str = "3.3"
 
-__ALL__ = ["parse_file", "parse_text", "LogseqPage", "LogseqBlock"]
+__ALL__ = ["parse_file", "parse_text", "read_page_properties", "append_blocks", "matches_prefilter", "set_check_level", "get_check_level", "CHECK_LEVELS", "LogseqPage", "LogseqBlock", "LogseqPageSnapshot", "LogseqBlockSnapshot", "LogseqPageDiff", "LogseqGraph", "LogseqPageProxy", "LogseqDateIndex", "LogseqPageNameIndex", "decode_page_name", "LogseqTimeIndex", "LogseqSearchIndex", "LogseqGraphDaemon", "LogseqSharedGraph", "LogseqSharedPageView", "LogseqSharedBlockView", "LogseqSQLiteStore", "HighlightAnchorer", "HighlightAnchor"]
 
 
 def parse_file(
     file_path: Union[str, PosixPath] = None,
     verbose: bool = False,
     out_format: Optional[str] = None,
-) -> Union[List[dict], str, LogseqPage]:
+    lazy_blocks: bool = False,
+    prefilter: Optional[Prefilter] = None,
+    lossless: bool = False,
+) -> Union[List[dict], str, LogseqPage, None]:
     """
     Parameters:
     -----------
@@ -28,21 +44,41 @@ def parse_file(
         Either 'json' or 'toml'. For example can be piped directly to jq
         If None, returns the LogseqPage directly
 
+    lazy_blocks: bool, default to False
+        if True, only the page properties are read from the file and the
+        blocks are parsed when page.blocks is first accessed
+
+    prefilter: default to None
+        if the file does not match it, None is returned without parsing
+        the file. See matches_prefilter for the accepted values.
+
+    lossless: bool, default to False
+        if True, the original text of each block is kept and written back
+        as is by page.export_to unless the block was modified
+
     Returns:
     --------
     Depending on out_format: Union[LogseqPage, List[dict], str]
+    None if the file did not match the prefilter
     """
     if file_path is not None:
         assert Path(file_path).exists(), f"{file_path} not found"
-
-        content = Path(file_path).read_text()
+        if prefilter is not None and not matches_prefilter(file_path, prefilter):
+            return None
+
+        parsed = LogseqPage(
+            file_path=file_path,
+            verbose=verbose,
+            lazy_blocks=lazy_blocks,
+            lossless=lossless,
+        )
     else:
-        content = sys.stdin.read()
-
-    parsed = LogseqPage(
-        content=content,
-        verbose=verbose,
-    )
+        parsed = LogseqPage(
+            content=sys.stdin.read(),
+            verbose=verbose,
+            lazy_blocks=lazy_blocks,
+            lossless=lossless,
+        )
 
     if out_format:
         return parsed.format(format=out_format)
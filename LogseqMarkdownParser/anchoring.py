@@ -0,0 +1,217 @@
+import re
+import difflib
+from typing import Callable, Optional, List, NamedTuple
+
+# only use beartype if its installed
+try:
+    from beartype import beartype as typechecker
+except Exception:
+    def typechecker(func: Callable) -> Callable:
+        return func
+
+# only use rapidfuzz if its installed, otherwise use difflib which is
+# much slower
+try:
+    from rapidfuzz import process as rf_process
+    from rapidfuzz.fuzz import partial_ratio_alignment
+    from rapidfuzz.distance import Levenshtein as rf_levenshtein
+except Exception:
+    rf_process = None
+
+WORD_REGEX = re.compile(r"\w+")
+
+
+class HighlightAnchor(NamedTuple):
+    """position of a highlight in the corpus: corpus[start:end] is the
+    matched text. score is between 0 and 100, 100 for an exact match."""
+    start: int
+    end: int
+    score: float
+    exact: bool
+
+
+@typechecker
+class HighlightAnchorer:
+    """Finds where highlights (e.g. from Omnivore) are in the text of an
+    article, even if the text of the highlight differs a bit from the
+    article (whitespace, hyphenation, PDF parsing artefacts etc).
+
+    The corpus is lowercased and indexed by word once, then each highlight
+    is anchored by:
+        1. looking for an exact match,
+        2. otherwise, using the positions of its words in the corpus to
+           vote for the most likely regions,
+        3. then finding the substring of those regions with the smallest
+           Levenshtein distance to the highlight. The distances of all the
+           candidate substrings are computed in one call to
+           rapidfuzz.process.cdist if rapidfuzz is installed, using all the
+           cores, otherwise difflib is used.
+
+    Methods:
+        - anchor
+        - anchor_many
+        - candidates
+    """
+
+    def __init__(
+        self,
+        corpus: str,
+        case_sensitive: bool = False,
+        min_word_length: int = 4,
+        n_regions: int = 3,
+    ) -> None:
+        """
+        corpus: the text in which the highlights are searched
+
+        case_sensitive: bool, default False
+
+        min_word_length: int, default 4
+            shorter words are not used to find the candidate regions
+
+        n_regions: int, default 3
+            number of candidate regions refined for each highlight
+        """
+        self.corpus = corpus
+        self.case_sensitive = case_sensitive
+        self.min_word_length = min_word_length
+        self.n_regions = n_regions
+        self._text = self._normalize(corpus)
+        self._words = {}  # word -> list of start offsets in the corpus
+        for m in WORD_REGEX.finditer(self._text):
+            if len(m.group()) >= min_word_length:
+                self._words.setdefault(m.group(), []).append(m.start())
+
+    def _normalize(self, text: str) -> str:
+        "lowercase the text without changing the offsets of its characters"
+        if self.case_sensitive:
+            return text
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            return lowered
+        # some characters change length when lowercased, keep them as is
+        return "".join(c.lower() if len(c.lower()) == 1 else c for c in text)
+
+    def _regions(self, query: str) -> List[int]:
+        """likely start offsets of the query in the corpus, best first,
+        found by letting each occurrence of each of its words vote"""
+        lq = len(query)
+        bucket = max(lq // 2, 1)
+        votes = {}
+        for m in WORD_REGEX.finditer(query):
+            word = m.group()
+            positions = self._words.get(word)
+            if not positions or len(positions) > 50:
+                continue  # too frequent to help
+            for pos in positions:
+                start = pos - m.start()
+                key = start // bucket
+                # the weight favors rare words
+                votes[key] = votes.get(key, 0.0) + 1.0 / len(positions)
+        if not votes:
+            # no shared word: coarse scan of the whole corpus
+            starts = list(range(0, max(len(self._text) - lq, 0) + 1, bucket))
+            windows = [self._text[s:s + lq] for s in starts]
+            scores = self._distances(query, windows)
+            ranked = sorted(range(len(starts)), key=lambda i: scores[i])
+            return [starts[i] for i in ranked[:self.n_regions]]
+        best = sorted(votes, key=lambda k: -votes[k])[:self.n_regions]
+        return [k * bucket for k in best]
+
+    def _distances(self, query: str, windows: List[str]) -> List[float]:
+        "normalized Levenshtein distance between the query and each window"
+        if not windows:
+            return []
+        if rf_process is not None:
+            return rf_process.cdist(
+                [query], windows,
+                scorer=rf_levenshtein.normalized_distance,
+                workers=-1,
+            )[0].tolist()
+        return [
+            1 - difflib.SequenceMatcher(None, query, w, autojunk=False).ratio()
+            for w in windows
+        ]
+
+    def _refine(self, query: str, region_start: int) -> HighlightAnchor:
+        "best matching substring around a candidate start offset"
+        lq = len(query)
+        left = max(region_start - lq, 0)
+        right = min(region_start + 2 * lq, len(self._text))
+        region = self._text[left:right]
+        # best window of the length of the query, then adjust both ends
+        if rf_process is not None:
+            alignment = partial_ratio_alignment(query, region)
+            start, end = alignment.dest_start, alignment.dest_end
+        else:
+            blocks = difflib.SequenceMatcher(
+                None, region, query, autojunk=False).get_matching_blocks()[:-1]
+            if not blocks:
+                return HighlightAnchor(left, left, 0.0, False)
+            start, end = blocks[0].a, blocks[-1].a + blocks[-1].size
+        # move each end in turn to where the distance is the smallest,
+        # until it does not improve
+        # without rapidfuzz, the distances are too slow to move far
+        delta = min(lq // 10, 30) + 2 if rf_process is not None else 4
+        best = None
+        for _ in range(3):
+            improved = False
+            for move_start in (True, False):
+                if move_start:
+                    spans = [(s, end) for s in range(max(start - delta, 0), min(start + delta, end - 1) + 1)]
+                else:
+                    spans = [(start, e) for e in range(max(end - delta, start + 1), min(end + delta, len(region)) + 1)]
+                if not spans:
+                    continue  # empty alignment
+                distances = self._distances(query, [region[s:e] for s, e in spans])
+                i = min(range(len(spans)), key=lambda i: (distances[i], abs(spans[i][1] - spans[i][0] - lq)))
+                if best is None or distances[i] < best[0]:
+                    best = (distances[i], spans[i])
+                    start, end = spans[i]
+                    improved = True
+            if not improved:
+                break
+        if best is None:
+            return HighlightAnchor(left + start, left + start, 0.0, False)
+        distance, (s, e) = best
+        return HighlightAnchor(left + s, left + e, round(100 * (1 - distance), 2), False)
+
+    def candidates(self, highlight: str, n: int = 3) -> List[HighlightAnchor]:
+        """up to n anchors of the highlight in different regions of the
+        corpus, best first. Only one if the match is exact."""
+        query = self._normalize(highlight.strip())
+        if not query or not self._text:
+            return []
+        found = self._text.find(query)
+        if found != -1:
+            return [HighlightAnchor(found, found + len(query), 100.0, True)]
+        anchors = []
+        for region_start in self._regions(query)[:n]:
+            anchor = self._refine(query, region_start)
+            if anchor not in anchors:
+                anchors.append(anchor)
+        return sorted(anchors, key=lambda a: -a.score)
+
+    def anchor(self, highlight: str, after: int = 0) -> Optional[HighlightAnchor]:
+        """the best anchor of the highlight, None if it or the corpus is empty.
+        If the highlight is found exactly several times, the first
+        occurrence starting at or after 'after' is preferred."""
+        query = self._normalize(highlight.strip())
+        if query and after:
+            found = self._text.find(query, after)
+            if found != -1:
+                return HighlightAnchor(found, found + len(query), 100.0, True)
+        anchors = self.candidates(highlight, n=self.n_regions)
+        return anchors[0] if anchors else None
+
+    def anchor_many(self, highlights: List[str]) -> List[Optional[HighlightAnchor]]:
+        """anchor each highlight. They are expected to be in the order
+        of the article: among identical exact matches, the one after the
+        previous highlight is preferred."""
+        anchors = []
+        after = 0
+        for highlight in highlights:
+            anchor = self.anchor(highlight, after=after)
+            if anchor is not None and anchor.exact:
+                after = anchor.end
+            anchors.append(anchor)
+        return anchors
@@ -1,10 +1,17 @@
-import textwrap
-from typing import Union, Any, Callable
+from typing import Union, Any, Callable, NamedTuple, Optional, List, Tuple
+import datetime
+import hashlib
+import itertools
+import weakref
+from types import MappingProxyType
 import uuid6
 import re
 import json
 import rtoml as toml
 
+from .checks import should_check, CHECK_LEVELS
+from .snapshot import LogseqBlockSnapshot, _shift_indentation
+
 # only use beartype if its installed
 try:
     from beartype import beartype as typechecker
@@ -44,22 +51,118 @@ class ImmutableDict(dict):
         raise TypeError("Cannot modify ImmutableDict after initialization")
     def update(self, *args, **kwargs):
         raise TypeError("Cannot modify ImmutableDict after initialization")
+    def __reduce__(self):
+        # pickle and copy would otherwise set the items before __frozen
+        return (ImmutableDict, (dict(self),))
+
+# each change of a block gets a new version, never reused
+_VERSIONS = itertools.count()
+
+# called with the block each time the content of any block is modified,
+# used by the indexes to stay up to date without rescanning every block.
+# Holds weak references so that an index can be garbage collected.
+_CONTENT_HOOKS = []
+
+
+def add_content_hook(hook: Callable) -> None:
+    "call hook(block) each time the content of a block is modified"
+    ref = weakref.WeakMethod(hook) if hasattr(hook, "__self__") else weakref.ref(hook)
+    _CONTENT_HOOKS.append(ref)
+
+
+def _run_content_hooks(block: "LogseqBlock") -> None:
+    dead = False
+    for ref in _CONTENT_HOOKS:
+        hook = ref()
+        if hook is None:
+            dead = True
+        else:
+            hook(block)
+    if dead:
+        _CONTENT_HOOKS[:] = [ref for ref in _CONTENT_HOOKS if ref() is not None]
+
+
+TODO_STATES = (
+    "TODO", "DOING", "NOW", "LATER", "DONE", "WAITING", "WAIT",
+    "CANCELED", "CANCELLED", "IN-PROGRESS", "STARTED",
+)
+
+
+class LogseqMarker(NamedTuple):
+    "TODO state, priority and SCHEDULED/DEADLINE dates of a block"
+    state: Optional[str] = None
+    priority: Optional[str] = None
+    scheduled: Optional[datetime.date] = None
+    deadline: Optional[datetime.date] = None
+
+
+class LogseqClock(NamedTuple):
+    "a CLOCK: line of a block's logbook, end and duration are None if still running"
+    start: datetime.datetime
+    end: Optional[datetime.datetime] = None
+    duration: Optional[datetime.timedelta] = None
+
+
+class LogseqBlockSpans(NamedTuple):
+    """parts of a block as [start, end) ranges of the indexes of the lines
+    of its content. Only the lines of properties and trailing_properties
+    are read to get the block properties."""
+    head: Tuple[int, int]  # first line, then any SCHEDULED: or DEADLINE: line
+    properties: Tuple[int, int]  # property lines right after the head
+    body: Tuple[int, int]
+    # property lines ending the block after its body, outside a code
+    # block. This is where previous versions of set_property added them.
+    trailing_properties: Tuple[int, int]
+
+
+def _parse_timestamp(groups: tuple) -> datetime.datetime:
+    "turn the groups of a logbook timestamp regex into a datetime"
+    return datetime.datetime(*[int(g) if g else 0 for g in groups])
+
 
 @typechecker
 class LogseqBlock:
     BLOCK_PROP_REGEX = re.compile(r"[ \t]+(\w[\w_-]*\w:: .+)")
-    INDENT_REGEX = re.compile(r"^[ ]*")
+    # a whole line holding a property, the first line of a block can
+    # also be one
+    BLOCK_PROP_LINE_REGEX = re.compile(r"[ \t]*(?:- )?(\w[\w_-]*\w):: (.+)")
+    DATE_LINE_REGEX = re.compile(r"[ \t]*(?:SCHEDULED|DEADLINE): ")
+    FENCE_REGEX = re.compile(r"^[ \t]*```", re.MULTILINE)
+    INDENT_REGEX = re.compile(r"^[ \t]*")
+    # anchored at the start of the content so only the first line is read
+    MARKER_REGEX = re.compile(
+        r"[ \t]*- (?:(" + "|".join(re.escape(s) for s in TODO_STATES) + r") )?"
+        r"(?:\[#([A-Za-z])\])?"
+    )
+    _TIMESTAMP = r"\[(\d{4})-(\d{2})-(\d{2})[^\]\d]* (\d{1,2}):(\d{2})(?::(\d{2}))?\]"
+    CLOCK_REGEX = re.compile(
+        r"^[ \t]*CLOCK: " + _TIMESTAMP + r"(?:--" + _TIMESTAMP + r")?",
+        re.MULTILINE,
+    )
+    DATE_REGEX = re.compile(
+        r"^[ \t]*(SCHEDULED|DEADLINE): <(\d{4})-(\d{2})-(\d{2})",
+        re.MULTILINE,
+    )
 
     def __init__(
             self,
             content: str,
             verbose: bool = False,
+            check_level: Optional[str] = None,
     ) -> None:
         """
         Class with the following new attributes:
             - indentation_level: in number of spaces, with tab=4
             - TODO_state: wether the block is in a TODO/DOING/NOW/LATER/DONE etc.
                               None otherwise.
+            - marker: a LogseqMarker with the TODO state, the priority
+                      (e.g. 'A' for [#A]) and the SCHEDULED and DEADLINE
+                      dates of the block.
+            - logbook: tuple of LogseqClock parsed from the CLOCK: lines
+                       of the :LOGBOOK: drawer.
+            - clocked_time: sum of the durations of the finished clocks.
+            - content_hash: hash of the content, independent of the
+                            indentation of the block.
             - UUID: a random UUID. It is not the same as the one used within
                   Logseq but can be used to keep track of parents.
                   If an 'id' property is already present in the block,
@@ -67,12 +170,22 @@ class LogseqBlock:
                   set by Logseq. Otherwise, a UUI6 (so sortable by time) will
                   be used.
             - properties: an ImmutableDict containing the block properties.
+                          Only the property lines following the first
+                          line (and the ones ending the block) are read,
+                          so 'key:: value' lines in the body, e.g. in a
+                          code block, are not properties.
+            - spans: a LogseqBlockSpans with the lines of the first line,
+                     the properties and the body of the block.
 
         Methods:
             - dict
             - format
             - set_property
+            - set_properties
             - del_property
+            - del_properties
+            - snapshot
+            - from_dict (classmethod)
 
         Note:
             - For modifying the content, properties, indentation_level or
@@ -86,24 +199,91 @@ class LogseqBlock:
               UUID is random() and not inscribed in the content. Just like
               in Logseq.
             - verbose argument is currently unused
+            - check_level can be 'off', 'basic' or 'paranoid' to set how
+              much internal consistency checking is done, the default None
+              uses the global level (see set_check_level).
         """
         assert content.lstrip().startswith("-"), (
             f"stripped block content must start with '- '. Not the case here: '{content}'")
         self.verbose = verbose
+        assert check_level is None or check_level in CHECK_LEVELS, (
+            f"check_level must be None or one of {CHECK_LEVELS}, not {check_level}")
+        self.check_level = check_level
         content = content.replace(u'\xa0', u' ')  # replace by regular space
         self._blockvalues = {
             'content': content,
+            'indent_offset': 0,  # in spaces, applied lazily to the content
+            'version': next(_VERSIONS),
         }
+        self._cache = {}  # values derived from the content, reset when it changes
         if "id" in self.properties:
             self._blockvalues["UUID"] = self.properties["id"]
         else:
             self._blockvalues["UUID"] = str(uuid6.uuid6())
         self._changed = False  # set to True if any value was manually changed
 
+    @classmethod
+    def from_dict(
+        cls,
+        record: dict,
+        check_level: Optional[str] = None,
+        validate: bool = True,
+    ) -> "LogseqBlock":
+        """create a block from a dict made by self.dict, keeping its UUID.
+        If validate is False, the content is trusted as is: it is neither
+        checked nor parsed until its values are accessed."""
+        content = record["block_content"]
+        if not validate:
+            return cls._trusted(
+                contents=[content],
+                uuids=[record.get("block_UUID") or str(uuid6.uuid6())],
+                check_level=check_level,
+            )[0]
+
+        block = cls(content=content, check_level=check_level)
+        if "id" not in block.properties and record.get("block_UUID"):
+            block._blockvalues["UUID"] = record["block_UUID"]
+        for key, value in [
+                ("block_indentation_level", block.indentation_level),
+                ("block_TODO_state", block.TODO_state),
+                ("block_UUID", block.UUID),
+                ("block_properties", dict(block.properties)),
+                ]:
+            assert key not in record or record[key] == value, (
+                f"{key} of the record does not match its content: "
+                f"'{record[key]}' vs '{value}'")
+        return block
+
+    @classmethod
+    def _trusted(
+        cls,
+        contents: list,
+        uuids: list,
+        check_level: Optional[str] = None,
+        verbose: bool = False,
+    ) -> list:
+        """create many blocks at once without checking nor parsing their
+        content, used to load pages that were already parsed"""
+        blocks = []
+        for content, uuid in zip(contents, uuids):
+            block = cls.__new__(cls)
+            block.verbose = verbose
+            block.check_level = check_level
+            block._blockvalues = {
+                'content': content,
+                'indent_offset': 0,
+                'version': next(_VERSIONS),
+                'UUID': uuid,
+            }
+            block._cache = {}
+            block._changed = False
+            blocks.append(block)
+        return blocks
+
     def __str__(self) -> str:
         """overloading of the original str to make it access the content
         attribute"""
-        return self._blockvalues["content"]
+        return self.content
 
     def __repr__(self) -> str:
         return f"LogseqBlock({self.__str__()})"
@@ -111,12 +291,20 @@ class LogseqBlock:
     @property
     def content(self) -> str:
         "content of the block. This includes the block properties."
+        offset = self._blockvalues["indent_offset"]
+        if offset:
+            # apply the pending indentation change only when needed
+            raw_level = self._get_raw_indentation()
+            self._blockvalues["content"] = _shift_indentation(
+                self._blockvalues["content"], offset)
+            self._blockvalues["indent_offset"] = 0
+            self._cache = {"raw_indentation": raw_level + offset}
         cont = self._blockvalues["content"]
         return cont
 
     @content.setter
     def content(self, new: str) -> None:
-        old = self._blockvalues["content"]
+        old = self.content
         assert isinstance(new, str), "new content must be a string"
         assert new.lstrip().startswith(
             "-") or ":: " in new, "stripped new content must start with '-' or be a property"
@@ -124,6 +312,10 @@ class LogseqBlock:
         if new != old:
             self._changed = True
             self._blockvalues["content"] = new
+            self._blockvalues["version"] = next(_VERSIONS)
+            self._cache = {}
+            if _CONTENT_HOOKS:
+                _run_content_hooks(self)
 
     @property
     def indentation_level(self) -> int:
@@ -131,79 +323,161 @@ class LogseqBlock:
 
     @indentation_level.setter
     def indentation_level(self, new: int) -> None:
-        # note: we don't compare the new to the old value
-        # because this way we make sure that leading spaces are replaced
-        # by tabs
+        """Only stores the difference with the current indentation, the
+        content is reindented the next time it is accessed. Shifting a block
+        is therefore O(1). The leading spaces are replaced by tabs only
+        when exporting the page."""
+        assert new >= 0, f"new indentation level must be positive, not {new}"
         assert new % 4 == 0, f"new indentation level must be divisible by 4, not {new}"
-        unindented = textwrap.dedent(self.content).strip()
-        reindented = textwrap.indent(unindented, "\t" * (new // 4))
-        self.content = reindented
+        self._blockvalues["indent_offset"] = new - self._get_raw_indentation()
+        self._blockvalues["version"] = next(_VERSIONS)
         self._changed = True
-        assert new == self.indentation_level, (
-            "block indentation level apparently failed to be set")
 
     @property
     def TODO_state(self) -> Union[None, str]:
         return self._get_TODO_state()
 
     @TODO_state.setter
-    def TODO_state(self, new: str) -> None:
+    def TODO_state(self, new: Optional[str]) -> None:
         old = self._get_TODO_state()
-        assert old in ["TODO", "DOING", "NOW", "LATER", "DONE", None], (
-            f"Invalid old TODO value: {old}")
-        if old:
-            assert f"- {old} " in self.content, (
-                f"Error: previous state '- {old} ' not in block content but should have been")
-
-        assert new in ["TODO", "DOING", "NOW", "LATER", "DONE", None], (
+        assert new in TODO_STATES or new is None, (
             f"Invalid new TODO value: {new}")
 
         if old != new:
-            if new is None:  # just delete
-                self.content = self.content.replace(
-                    f"- {old} ",
-                    "- ",
-                    1,
-                )
+            content = self.content
+            indent = len(content) - len(content.lstrip())
+            if old is None:
+                assert content[indent:].startswith("- ")
+                self.content = content[:indent] + f"- {new} " + content[indent + 2:]
             else:
-                self.content = self.content.replace(
-                    f"- {old} ",
-                    f"- {new} ",
-                    1)
+                assert content[indent:].startswith(f"- {old} "), (
+                    f"Error: previous state '- {old} ' not in block content but should have been")
+                replacement = f"- {new} " if new else "- "
+                self.content = (
+                    content[:indent] + replacement
+                    + content[indent + len(old) + 3:]
+                )
             self._changed = True
 
+    @property
+    def marker(self) -> LogseqMarker:
+        "TODO state, priority, SCHEDULED and DEADLINE dates of the block"
+        if "marker" not in self._cache:
+            self._cache["marker"] = self._get_marker()
+        return self._cache["marker"]
+
+    @property
+    def logbook(self) -> tuple:
+        "the CLOCK: entries of the :LOGBOOK: drawer as LogseqClock"
+        if "logbook" not in self._cache:
+            self._cache["logbook"] = self._get_logbook()
+        return self._cache["logbook"]
+
+    @property
+    def clocked_time(self) -> datetime.timedelta:
+        "total time of the finished CLOCK: entries"
+        return sum(
+            (c.duration for c in self.logbook if c.duration is not None),
+            datetime.timedelta(0),
+        )
+
+    @property
+    def content_hash(self) -> str:
+        "hash of the content of the block, it does not depend on its indentation"
+        content = self.content
+        if "hash" not in self._cache:
+            level = self._get_indentation()
+            if level:
+                content = _shift_indentation(content, -level)
+            self._cache["hash"] = hashlib.blake2b(
+                content.encode(), digest_size=16).hexdigest()
+        return self._cache["hash"]
+
+    @property
+    def spans(self) -> LogseqBlockSpans:
+        "line ranges of the head, properties and body of the block"
+        if "spans" not in self._cache:
+            self._cache["spans"] = self._lex(self.content.split("\n"))
+        return self._cache["spans"]
+
     @property
     def properties(self) -> ImmutableDict:
         "Shows the block properties, but to modify them, you have to use the 'set_property' method"
-        return self._get_properties()
+        if "properties" not in self._cache:
+            self._cache["properties"] = dict(self._get_properties())
+        return ImmutableDict(self._cache["properties"])
 
     @properties.setter
     def property_failedsetter(self, *args, **kwargs) -> None:
         raise Exception(
             "To modify the properties you must use self.set_property(key, value)")
 
-    def _get_properties(self) -> ImmutableDict:
-        prop = re.findall(self.BLOCK_PROP_REGEX, self.content)
-        properties = {}
-        for found in prop:
-            assert found == found.lstrip(
-            ), f"REGEX match an incorrect property: {found}"
-
-            try:
-                key, value = found.split(":: ")
-                properties[key.strip()] = value.strip()
-            except ValueError:
-                # probably failed because it was not a property but a long line that contained ::
-                raise Exception(f"Failed to parse property: {found}")
+    def _lex(self, lines: List[str]) -> LogseqBlockSpans:
+        """split the lines of the content into a LogseqBlockSpans. Only the
+        lines around the properties are matched against a regex, the lines
+        of the body are not"""
+        is_prop = self.BLOCK_PROP_LINE_REGEX.fullmatch
+        n = len(lines)
+        if is_prop(lines[0]):
+            head_end = 0
+        else:
+            head_end = 1
+            while head_end < n and self.DATE_LINE_REGEX.match(lines[head_end]):
+                head_end += 1
+        # a first line like '- ```yaml' opens a code block: what follows
+        # is its content, not properties
+        opens_fence = head_end > 0 and self._opens_fence(lines[0])
+        props_end = head_end
+        while not opens_fence and props_end < n and is_prop(lines[props_end]):
+            props_end += 1
+        tail_start = n
+        while tail_start > props_end and is_prop(lines[tail_start - 1]):
+            tail_start -= 1
+        if tail_start < n:
+            body = "\n".join(lines[props_end:tail_start])
+            if (len(self.FENCE_REGEX.findall(body)) + opens_fence) % 2:
+                tail_start = n  # they are inside an unclosed code block
+        return LogseqBlockSpans(
+            head=(0, head_end),
+            properties=(head_end, props_end),
+            body=(props_end, tail_start),
+            trailing_properties=(tail_start, n),
+        )
 
-        cont = self.content
-        for k, v in properties.items():
-            assert f"{k}:: " in cont, f"Missing key '{k}' in content"
-            assert f"{k}:: {v}" in cont, f"Missing key/value {key}/{value} in content"
+    @staticmethod
+    def _opens_fence(first_line: str) -> bool:
+        return first_line.count("```") % 2 == 1
+
+    def _property_lines(self, lines: List[str]) -> List[Tuple[int, re.Match]]:
+        "index and regex match of each property line, in order"
+        if "spans" not in self._cache:
+            self._cache["spans"] = self._lex(lines)
+        spans = self._cache["spans"]
+        found = []
+        for start, end in (spans.properties, spans.trailing_properties):
+            for i in range(start, end):
+                found.append((i, self.BLOCK_PROP_LINE_REGEX.fullmatch(lines[i])))
+        return found
 
-        n_id = len(re.findall(r"[ \t]+id:: [\w-]+", cont))
-        assert n_id in [0, 1], f"Found {n_id} mention of id:: property"
-        properties = ImmutableDict(properties.copy())
+    def _get_properties(self) -> ImmutableDict:
+        properties = {}
+        prop_lines = self._property_lines(self.content.split("\n"))
+        for _, found in prop_lines:
+            key, value = found.groups()
+            if ":: " in value:
+                # probably not a property but a long line that contained ::
+                raise Exception(f"Failed to parse property: {found.group(0)}")
+            properties[key] = value.strip()
+
+        if should_check(self.check_level, "paranoid"):
+            cont = self.content
+            for k, v in properties.items():
+                assert f"{k}:: " in cont, f"Missing key '{k}' in content"
+                assert f"{k}:: {v}" in cont, f"Missing key/value {k}/{v} in content"
+
+            n_id = sum(found.group(1) == "id" for _, found in prop_lines)
+            assert n_id in [0, 1], f"Found {n_id} mention of id:: property"
+        properties = ImmutableDict(properties)
 
         return properties
 
@@ -217,23 +491,47 @@ class LogseqBlock:
         Delete a property of the block.
         Note that this will also directly alter the block content.
         """
-        assert isinstance(key, str), f"key must be a string, not {type(key)}"
-        assert key in self.properties, "key not found in properties"
-        count =  self.content.count(f"{key}:: ")
-        assert count == 1, (
-            f"Key {key} found {count} times in {self.content}")
-        temp = []
-        for line in self.content.split("\n"):
-            if not re.search(rf"[ \t]+{key}:: ", line):
-                temp.append(line)
-        new_content = "\n".join(temp)
-        assert new_content.count(f"{key}::") == 0, (
-            f"invalid number of key {key} in {new_content}")
-        self.content = new_content
+        self.del_properties([key])
+
+    def del_properties(
+        self,
+        keys: list,
+        ) -> None:
+        """
+        Delete several properties of the block, rewriting the content once.
+        Note that this will also directly alter the block content.
+        """
+        for key in keys:
+            assert isinstance(key, str), f"key must be a string, not {type(key)}"
+        if not keys:
+            return
+        properties = self.properties
+        for key in keys:
+            assert key in properties, f"key {key} not found in properties"
+        paranoid = should_check(self.check_level, "paranoid")
+        lines = self.content.split("\n")
+        prop_lines = self._property_lines(lines)
+        if paranoid:
+            for key in keys:
+                count = sum(found.group(1) == key for _, found in prop_lines)
+                assert count == 1, (
+                    f"Key {key} found {count} times in {self.content}")
+        keys = set(keys)
+        for i, found in reversed(prop_lines):
+            if found.group(1) in keys:
+                if i == 0:
+                    # keep the '- ' of a block starting with a property
+                    lines[0] = lines[0][:found.start(1)]
+                else:
+                    del lines[i]
+        self.content = "\n".join(lines)
         self._changed = True
 
-        assert key not in self.properties, (
-            "key apparently failed to be deleted")
+        if should_check(self.check_level, "basic"):
+            properties = self.properties
+            for key in keys:
+                assert key not in properties, (
+                    f"key {key} apparently failed to be deleted")
 
     def set_property(
             self,
@@ -245,42 +543,104 @@ class LogseqBlock:
         The key must be a string and the value will be cast as string.
         Note that this will also directly alter the block content.
         """
-        assert isinstance(key, str), f"key must be a string, not {type(key)}"
-        try:
-            value = str(value)
-        except Exception as err:
-            raise Exception(
-                f"Failed to parse as string: '{value}' (err:{err})")
-
-        assert value, f"Cannot add empty string property for key {key}"
-        assert len(value.splitlines()
-                    ) == 1, "cannot add property containing newlines"
-
-        old_content = self.content
-        if key in self.properties:  # edit prop
-            old_val = self.properties[key]
-            assert self.content.count(f"{key}:: {old_val}") == 1, (
-                "unable to find key/val pair: {key}/{old_val}")
-            lines = self.content.splitlines(keepends=True)[::-1]
-            for ili, li in enumerate(lines):
-                if f"{key}:: {old_val}" in li:
-                    li[ili] = li.replace(old_val, value)
-                    break
-            self.content = "".join(lines[::-1])
-        else:  # add prop
-            new = "\n" + "\t" * (self.indentation_level // 4)
-            new += f"  {key}:: {value}"
-            self.content += new
-            assert old_content in self.content
+        self.set_properties({key: value})
 
+    def set_properties(
+            self,
+            properties: dict,
+        ) -> None:
+        """
+        Set several properties of the block, the content is parsed and
+        rewritten only once.
+        The keys must be strings and the values will be cast as string.
+        Note that this will also directly alter the block content.
+        """
+        new_props = {}
+        for key, value in properties.items():
+            assert isinstance(key, str), f"key must be a string, not {type(key)}"
+            try:
+                value = str(value)
+            except Exception as err:
+                raise Exception(
+                    f"Failed to parse as string: '{value}' (err:{err})")
+
+            assert value, f"Cannot add empty string property for key {key}"
+            assert len(value.splitlines()
+                        ) == 1, "cannot add property containing newlines"
+            new_props[key] = value
+        if not new_props:
+            return
+
+        paranoid = should_check(self.check_level, "paranoid")
+        old_props = self.properties
+        lines = self.content.split("\n")
+        prop_lines = self._property_lines(lines)
+        if paranoid:
+            for key in new_props:
+                if key in old_props:
+                    count = sum(found.group(1) == key for _, found in prop_lines)
+                    assert count == 1, (
+                        f"unable to find key/val pair: {key}/{old_props[key]}")
+
+        # edit the existing properties, starting from the end like
+        # _get_properties where the latest occurence wins
+        to_edit = {k for k in new_props if k in old_props}
+        for i, found in reversed(prop_lines):
+            key = found.group(1)
+            if key in to_edit:
+                to_edit.remove(key)
+                lines[i] = lines[i][:found.start(2)] + new_props[key]
+
+        # add the new ones at the end of the property lines following the
+        # first line, where Logseq puts them, or at the end of the block if
+        # the first line opens a code block
+        indent = "\t" * (self.indentation_level // 4)
+        spans = self._cache["spans"]
+        props_end = spans.properties[1]
+        if spans.head[1] > 0 and self._opens_fence(lines[0]):
+            props_end = len(lines)
+        lines[props_end:props_end] = [
+            f"{indent}  {key}:: {value}"
+            for key, value in new_props.items() if key not in old_props
+        ]
+
+        self.content = "\n".join(lines)
         self._changed = True
-        assert self.content.count(f"{key}:: {value}") == 1, (
-            "unable to find key/val pair after it was set: {key}/{value}")
 
-        assert key in self.properties, (
-            "key apparently failed to be added")
-        assert value == self.properties[key], (
-            "key apparently failed to be set to the right value")
+        if paranoid:
+            properties = self.properties
+            for key, value in new_props.items():
+                count = sum(
+                    found.group(1) == key
+                    for _, found in self._property_lines(self.content.split("\n")))
+                assert count == 1 and properties[key] == value, (
+                    f"unable to find key/val pair after it was set: {key}/{value}")
+
+        if should_check(self.check_level, "basic"):
+            properties = self.properties
+            for key, value in new_props.items():
+                assert key in properties, (
+                    f"key {key} apparently failed to be added")
+                assert value == properties[key], (
+                    f"key {key} apparently failed to be set to the right value")
+
+    def snapshot(self) -> LogseqBlockSnapshot:
+        """returns an immutable copy of the block values. The same object
+        is returned as long as the block is not modified."""
+        version = self._blockvalues["version"]
+        cached = self._cache.get("snapshot")
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        snap = LogseqBlockSnapshot(
+            content=self.content,
+            indentation_level=self.indentation_level,
+            TODO_state=self.TODO_state,
+            marker=self.marker,
+            properties=MappingProxyType(dict(self.properties)),
+            UUID=self.UUID,
+        )
+        self._cache["snapshot"] = (version, snap)
+        return snap
 
     def format(self, format: str) -> Union[dict, str]:
         """format the block. Formats are 'dict', 'json', 'toml'"""
@@ -306,24 +666,60 @@ class LogseqBlock:
         return self.format(format="dict")
 
     def _get_TODO_state(self) -> Union[None, str]:
-        TODO_state = None
-        for keyword in ["TODO", "DOING", "NOW", "LATER", "DONE"]:
-            if re.search(f"- {keyword} .*", self.content.lstrip()):
-                assert not TODO_state, (
-                    "block content fits multiple TODO states: "
-                    f"'{self.content}'")
-                TODO_state = keyword
-        return TODO_state
+        return self.marker.state
+
+    def _get_marker(self) -> LogseqMarker:
+        content = self.content
+        match = self.MARKER_REGEX.match(content)
+        if match is None:
+            return LogseqMarker()
+        state, priority = match.groups()
+        dates = {}
+        if "SCHEDULED: " in content or "DEADLINE: " in content:
+            for kind, y, m, d in self.DATE_REGEX.findall(content):
+                if kind.lower() in dates:
+                    continue
+                try:
+                    dates[kind.lower()] = datetime.date(int(y), int(m), int(d))
+                except ValueError:
+                    # invalid date like <2024-13-45 Mon>, the next valid
+                    # one is used if any
+                    continue
+        return LogseqMarker(
+            state=state,
+            priority=priority.upper() if priority else None,
+            **dates,
+        )
+
+    def _get_logbook(self) -> tuple:
+        content = self.content
+        if ":LOGBOOK:" not in content:
+            return ()
+        clocks = []
+        for found in self.CLOCK_REGEX.findall(content):
+            try:
+                start = _parse_timestamp(found[:6])
+                end = _parse_timestamp(found[6:]) if found[6] else None
+            except ValueError:
+                continue  # invalid date or time
+            clocks.append(LogseqClock(
+                start=start,
+                end=end,
+                duration=end - start if end is not None else None,
+            ))
+        return tuple(clocks)
 
     def _get_indentation(self) -> int:
-        """count the leading spaces of a block to know the indentation level"""
-        n = len(
-            re.search(
-                self.INDENT_REGEX,
-                self.content.replace("\t", " " * 4)
-            ).group(0)
-        )
-        return n
+        """indentation level, including any pending change"""
+        return self._get_raw_indentation() + self._blockvalues["indent_offset"]
+
+    def _get_raw_indentation(self) -> int:
+        """count the leading spaces of the stored content to know its
+        indentation level, with tab=4"""
+        if "raw_indentation" not in self._cache:
+            leading = re.match(self.INDENT_REGEX, self._blockvalues["content"]).group(0)
+            self._cache["raw_indentation"] = len(leading.replace("\t", " " * 4))
+        return self._cache["raw_indentation"]
 
     @property
     def UUID(self) -> str:
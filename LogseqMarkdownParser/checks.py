@@ -0,0 +1,30 @@
+from typing import Optional
+
+# how much internal consistency checking is done:
+#   - off: only the arguments given by the user are validated
+#   - basic: cheap checks on the parsed values
+#   - paranoid: also recheck the content after each parsing and edition,
+#               this can be much slower on large pages
+CHECK_LEVELS = ("off", "basic", "paranoid")
+
+_global_check_level = {"level": "basic"}
+
+
+def set_check_level(level: str) -> None:
+    """set the check level used by the pages and blocks that don't have
+    their own check_level"""
+    assert level in CHECK_LEVELS, f"check level must be one of {CHECK_LEVELS}, not {level}"
+    _global_check_level["level"] = level
+
+
+def get_check_level() -> str:
+    "the global check level"
+    return _global_check_level["level"]
+
+
+def should_check(level: Optional[str], minimum: str) -> bool:
+    """True if checks of the 'minimum' level must be run for an object
+    whose check_level is 'level' (None meaning the global level)"""
+    if level is None:
+        level = _global_check_level["level"]
+    return CHECK_LEVELS.index(level) >= CHECK_LEVELS.index(minimum)
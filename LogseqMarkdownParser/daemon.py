@@ -0,0 +1,322 @@
+import time
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from types import MappingProxyType
+from typing import Union, Callable, Optional, Tuple
+from pathlib import Path, PosixPath
+import fire
+
+# only use beartype if its installed
+try:
+    from beartype import beartype as typechecker
+except Exception:
+    def typechecker(func: Callable) -> Callable:
+        return func
+
+# only use inotify if its installed, otherwise poll the file mtimes
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except Exception:
+    INotify = None
+
+from .graph import LogseqGraph
+from .prefilter import Prefilter
+
+
+@typechecker
+class LogseqGraphDaemon:
+    """Keeps a parsed Logseq graph in memory and reparses only the files
+    that changed on disk. Queries are answered over a local HTTP endpoint.
+
+    Files are watched with inotify if the 'inotify_simple' package is
+    installed, otherwise their mtime and size are polled.
+    As Logseq tends to rewrite a file several times in a row, a file is only
+    reparsed once it has not changed for 'debounce' seconds.
+
+    Readers always go through self.snapshot: a read-only mapping from page
+    name to LogseqPage that is replaced as a whole after each batch of
+    reparsed files. A reader that grabbed a snapshot will therefore never
+    see a half updated page. The pages of a snapshot must not be modified.
+
+    Endpoints (all return json):
+        - /pages
+            list of page names
+        - /page?name=NAME&format=FORMAT
+            the page formatted as 'json' (default), 'toml' or 'md'
+        - /properties?name=NAME
+            the page properties
+        - /blocks?contains=TEXT&todo=STATE
+            every block matching all the given filters
+
+    Methods:
+        - start
+        - stop
+        - serve_forever
+        - process_pending
+    """
+
+    def __init__(
+        self,
+        graph_dir: Union[str, PosixPath],
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        debounce: float = 1.0,
+        poll_interval: float = 2.0,
+        use_inotify: bool = True,
+        prefilter: Optional[Prefilter] = None,
+        verbose: bool = False,
+    ) -> None:
+        self.graph = LogseqGraph(
+            graph_dir=graph_dir,
+            prefilter=prefilter,
+            verbose=verbose,
+        )
+        self.host = host
+        self.port = port
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and INotify is not None
+        self.verbose = verbose
+
+        self._pending = {}  # path -> time of the latest change
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._server = None
+        self._mtimes = self._scan_mtimes()
+        self._publish()
+
+    @property
+    def snapshot(self) -> MappingProxyType:
+        "read-only mapping of page name to LogseqPage, never modified in place"
+        return self._snapshot
+
+    def _publish(self) -> None:
+        "build a new snapshot then swap it in a single assignment"
+        self._snapshot = MappingProxyType({
+            self.graph.page_name(path): page
+            for path, page in self.graph.pages.items()
+        })
+
+    def _scan_mtimes(self) -> dict:
+        mtimes = {}
+        for f in self.graph.iter_files():
+            try:
+                st = f.stat()
+            except FileNotFoundError:
+                continue
+            mtimes[f] = (st.st_mtime_ns, st.st_size)
+        return mtimes
+
+    def notify(self, path: Union[str, PosixPath]) -> None:
+        "mark a file as changed, it will be reparsed after the debounce delay"
+        with self._lock:
+            self._pending[Path(path)] = time.monotonic()
+
+    def process_pending(self, force: bool = False) -> int:
+        """reparse the files that did not change for 'debounce' seconds
+        and publish a new snapshot. Returns the number of reparsed files."""
+        now = time.monotonic()
+        with self._lock:
+            ready = [
+                p for p, t in self._pending.items()
+                if force or now - t >= self.debounce
+            ]
+            for p in ready:
+                del self._pending[p]
+        if not ready:
+            return 0
+
+        for path in ready:
+            try:
+                self.graph.load_file(path)
+            except Exception as err:
+                # keep serving the previous version of the page
+                if self.verbose:
+                    print(f"Failed to parse {path}: '{err}'")
+        self._publish()
+        if self.verbose:
+            print(f"Reparsed {len(ready)} file(s)")
+        return len(ready)
+
+    def _poll_changes(self) -> None:
+        mtimes = self._scan_mtimes()
+        for path in set(mtimes) | set(self._mtimes):
+            if mtimes.get(path) != self._mtimes.get(path):
+                self.notify(path)
+        self._mtimes = mtimes
+
+    def _watch_polling(self) -> None:
+        while not self._stop.is_set():
+            self._poll_changes()
+            self.process_pending()
+            self._stop.wait(min(self.poll_interval, self.debounce))
+
+    def _watch_inotify(self) -> None:
+        inotify = INotify()
+        mask = (
+            inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO
+            | inotify_flags.MOVED_FROM | inotify_flags.DELETE
+            | inotify_flags.CREATE | inotify_flags.MODIFY
+        )
+        watched = {}
+        for subdir in self.graph.subdirs:
+            folder = self.graph.graph_dir / subdir
+            if folder.exists():
+                watched[inotify.add_watch(str(folder), mask)] = folder
+        timeout = int(self.debounce * 1000 / 2) or 1
+        try:
+            while not self._stop.is_set():
+                for event in inotify.read(timeout=timeout):
+                    if event.name.endswith(".md") and event.wd in watched:
+                        self.notify(watched[event.wd] / event.name)
+                self.process_pending()
+        finally:
+            inotify.close()
+
+    def _make_handler(self) -> type:
+        daemon = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args, **kwargs) -> None:
+                if daemon.verbose:
+                    super().log_message(*args, **kwargs)
+
+            def _send(self, code: int, payload: Union[str, list, dict]) -> None:
+                body = json.dumps(payload, ensure_ascii=False).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                try:
+                    code, payload = daemon.query(url.path, query)
+                except Exception as err:
+                    code, payload = 500, {"error": str(err)}
+                self._send(code, payload)
+
+        return Handler
+
+    def query(self, endpoint: str, query: dict) -> Tuple[int, Union[str, list, dict]]:
+        """answer a query against the current snapshot.
+        Returns a tuple (http code, json serializable payload)"""
+        snapshot = self.snapshot  # the same snapshot is used for the whole query
+        if endpoint == "/pages":
+            return 200, sorted(snapshot.keys())
+
+        elif endpoint in ["/page", "/properties"]:
+            name = query.get("name")
+            if name not in snapshot:
+                return 404, {"error": f"page not found: {name}"}
+            page = snapshot[name]
+            if endpoint == "/properties":
+                return 200, page.page_properties
+            out_format = query.get("format", "json")
+            if out_format == "md":
+                # page.content can reindent blocks, the snapshot never
+                # modifies the page
+                return 200, page.snapshot().content
+            elif out_format == "json":
+                return 200, page.format("list_of_dict")
+            elif out_format == "toml":
+                return 200, page.format("toml")
+            return 400, {"error": f"unsupported format: {out_format}"}
+
+        elif endpoint == "/blocks":
+            contains = query.get("contains")
+            todo = query.get("todo")
+            found = []
+            for name, page in snapshot.items():
+                for block in page.blocks:
+                    if contains is not None and contains not in block.content:
+                        continue
+                    if todo is not None and block.TODO_state != todo:
+                        continue
+                    found.append({"page": name, "block": block.dict()})
+            return 200, found
+
+        return 404, {"error": f"unknown endpoint: {endpoint}"}
+
+    def start(self) -> None:
+        "start watching the graph and serving queries in background threads"
+        self._stop.clear()
+        watcher = self._watch_inotify if self.use_inotify else self._watch_polling
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.port = self._server.server_address[1]  # in case port was 0
+        self._threads = [
+            threading.Thread(target=watcher, daemon=True),
+            threading.Thread(target=self._server.serve_forever, daemon=True),
+        ]
+        for t in self._threads:
+            t.start()
+        if self.verbose:
+            print(f"Serving {self.graph.graph_dir} on http://{self.host}:{self.port}")
+
+    def stop(self) -> None:
+        "stop the watcher and the server"
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def serve_forever(self) -> None:
+        "start then block until interrupted"
+        self.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def serve(
+    graph_dir: str,
+    host: str = "127.0.0.1",
+    port: int = 8765,
+    debounce: float = 1.0,
+    poll_interval: float = 2.0,
+    verbose: bool = False,
+) -> None:
+    """
+    Parameters:
+    -----------
+
+    graph_dir: path to the logseq graph
+
+    host: default to 127.0.0.1
+
+    port: default to 8765
+
+    debounce: float, default to 1.0
+        number of seconds a file must stay untouched before being reparsed
+
+    poll_interval: float, default to 2.0
+        number of seconds between two scans of the graph if inotify is
+        not available
+
+    verbose: bool, default to False
+    """
+    LogseqGraphDaemon(
+        graph_dir=graph_dir,
+        host=host,
+        port=port,
+        debounce=debounce,
+        poll_interval=poll_interval,
+        verbose=verbose,
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    fire.Fire(serve)
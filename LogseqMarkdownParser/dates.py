@@ -0,0 +1,176 @@
+import re
+import json
+import datetime
+from bisect import bisect_left, bisect_right
+from typing import Union, Callable, Optional, List, Tuple
+from pathlib import Path, PosixPath
+
+# only use beartype if its installed
+try:
+    from beartype import beartype as typechecker
+except Exception:
+    def typechecker(func: Callable) -> Callable:
+        return func
+
+from .pages import read_page_properties
+
+ORDINAL_REGEX = re.compile(r"(\d+)(st|nd|rd|th)\b")
+
+
+@typechecker
+class LogseqDateIndex:
+    """Index of the date of each page of a graph, to select the pages
+    between two dates without opening them.
+
+    The date of a journal comes from its file name. The date of the other
+    pages comes from the first of date_properties that they have, for
+    example 'date-saved'. Only the start of the file up to the first block
+    is read to get it, and only if the file changed since the last update.
+
+    If cache_path is given, the index is saved there as json and reloaded
+    on the next run so that only new or modified files are read.
+
+    The selected paths can be given to LogseqGraph.load to only parse them.
+
+    Methods:
+        - update
+        - save
+        - between
+        - get
+    """
+
+    def __init__(
+        self,
+        graph_dir: Union[str, PosixPath],
+        date_properties: Tuple[str, ...] = (),
+        date_formats: Tuple[str, ...] = (
+            "%Y-%m-%d", "%d-%m-%Y", "%Y_%m_%d", "%Y/%m/%d", "%b %d, %Y"),
+        journal_format: str = "%Y_%m_%d",
+        cache_path: Optional[Union[str, PosixPath]] = None,
+    ) -> None:
+        self.graph_dir = Path(graph_dir)
+        assert self.graph_dir.exists(), f"Dir not found: {graph_dir}"
+        self.date_properties = date_properties
+        self.date_formats = date_formats
+        self.journal_format = journal_format
+        self.cache_path = Path(cache_path) if cache_path is not None else None
+
+        self._entries = {}  # relative path -> [mtime_ns, size, iso date or None]
+        if self.cache_path is not None and self.cache_path.exists():
+            cached = json.loads(self.cache_path.read_text())
+            if cached.get("settings") == self._settings():
+                self._entries = cached["entries"]
+        self._sorted = []  # sorted (date, relative path)
+        self._keys = []
+        self.update()
+
+    def _settings(self) -> list:
+        "the cache is only reused if these did not change"
+        return [list(self.date_properties), list(self.date_formats), self.journal_format]
+
+    def parse_date(self, value: str) -> Optional[datetime.date]:
+        "parse a date property value like '[[19-10-2024]]', None if no format matches"
+        value = value.strip().strip("[]").strip()
+        value = ORDINAL_REGEX.sub(r"\1", value)
+        for fmt in self.date_formats:
+            try:
+                return datetime.datetime.strptime(value, fmt).date()
+            except ValueError:
+                continue
+        return None
+
+    def _date_of(self, rel: str, path: Path) -> Optional[datetime.date]:
+        if rel.startswith("journals/"):
+            try:
+                return datetime.datetime.strptime(path.stem, self.journal_format).date()
+            except ValueError:
+                pass
+        if not self.date_properties:
+            return None
+        props = read_page_properties(path)
+        for prop in self.date_properties:
+            if prop in props:
+                date = self.parse_date(props[prop])
+                if date is not None:
+                    return date
+        return None
+
+    def update(self) -> int:
+        """rescan the graph directories, only reading the files that are new
+        or changed. Returns the number of files that were read."""
+        subdirs = ["journals"]
+        if self.date_properties:
+            subdirs.append("pages")
+        seen = set()
+        n_read = 0
+        changed = False
+        for subdir in subdirs:
+            folder = self.graph_dir / subdir
+            if not folder.exists():
+                continue
+            for path in folder.iterdir():
+                if path.suffix != ".md":
+                    continue
+                rel = f"{subdir}/{path.name}"
+                seen.add(rel)
+                if subdir == "journals" and rel in self._entries:
+                    continue  # the date is in the file name
+                st = path.stat()
+                old = self._entries.get(rel)
+                if old is not None and old[:2] == [st.st_mtime_ns, st.st_size]:
+                    continue
+                date = self._date_of(rel, path)
+                if subdir == "pages":
+                    n_read += 1
+                self._entries[rel] = [
+                    st.st_mtime_ns,
+                    st.st_size,
+                    date.isoformat() if date is not None else None,
+                ]
+                changed = True
+        for rel in list(self._entries):
+            if rel not in seen:
+                del self._entries[rel]
+                changed = True
+
+        self._sorted = sorted(
+            (datetime.date.fromisoformat(v[2]), rel)
+            for rel, v in self._entries.items()
+            if v[2] is not None
+        )
+        self._keys = [d for d, _ in self._sorted]
+        if changed and self.cache_path is not None:
+            self.save()
+        return n_read
+
+    def save(self) -> None:
+        "save the index to cache_path"
+        assert self.cache_path is not None, "no cache_path was given"
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self.cache_path.write_text(json.dumps({
+            "settings": self._settings(),
+            "entries": self._entries,
+        }))
+
+    def get(self, path: Union[str, PosixPath]) -> Optional[datetime.date]:
+        "date of the file at path, None if unknown"
+        path = Path(path)
+        entry = self._entries.get(f"{path.parent.name}/{path.name}")
+        if entry is None or entry[2] is None:
+            return None
+        return datetime.date.fromisoformat(entry[2])
+
+    def between(
+        self,
+        start: Optional[datetime.date] = None,
+        end: Optional[datetime.date] = None,
+        newest_first: bool = True,
+    ) -> List[Path]:
+        """paths of the pages dated between start and end (both included,
+        None for no limit), newest first by default"""
+        lo = 0 if start is None else bisect_left(self._keys, start)
+        hi = len(self._keys) if end is None else bisect_right(self._keys, end)
+        selected = [self.graph_dir / rel for _, rel in self._sorted[lo:hi]]
+        if newest_first:
+            selected.reverse()
+        return selected
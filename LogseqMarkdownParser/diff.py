@@ -0,0 +1,86 @@
+import hashlib
+from bisect import bisect_left
+from typing import NamedTuple, List, Tuple
+
+from .blocks import LogseqBlock
+
+
+class LogseqPageDiff(NamedTuple):
+    """Differences between two versions of a page, returned by
+    LogseqPage.diff. Blocks are referred to by their index in the blocks
+    of the old page and of the new page.
+
+    Attributes:
+        - inserted
+            indexes in the new page of the blocks absent from the old one
+        - deleted
+            indexes in the old page of the blocks absent from the new one
+        - moved
+            (old index, new index) of the blocks whose order relative to
+            the other blocks changed
+        - reindented
+            (old index, new index, old level, new level)
+        - properties_changed
+            (old index, new index, {key: new value or None if deleted})
+        - edited
+            (old index, new index) of the blocks matched by UUID whose
+            text changed in other ways than their properties
+        - page_properties_changed
+            {key: new value or None if deleted}
+        - patch
+            json serializable patch to turn the old page into the new one,
+            see LogseqPage.apply_patch
+    """
+    inserted: List[int]
+    deleted: List[int]
+    moved: List[Tuple[int, int]]
+    reindented: List[Tuple[int, int, int, int]]
+    properties_changed: List[Tuple[int, int, dict]]
+    edited: List[Tuple[int, int]]
+    page_properties_changed: dict
+    patch: dict
+
+    def __bool__(self) -> bool:
+        "False if the pages are the same"
+        return any(self[:7])
+
+
+def body_hash(block: LogseqBlock) -> str:
+    "hash of the content of a block without its property lines and indentation"
+    lines = block.content.split("\n")
+    spans = block.spans
+    props = set(range(*spans.properties)) | set(range(*spans.trailing_properties))
+    body = "\n".join(
+        li.strip() for i, li in enumerate(lines) if i not in props
+    )
+    return hashlib.blake2b(body.encode(), digest_size=16).hexdigest()
+
+
+def properties_delta(old: dict, new: dict) -> dict:
+    "{key: new value or None if deleted} to go from old to new"
+    delta = {k: v for k, v in new.items() if old.get(k) != v}
+    delta.update({k: None for k in old if k not in new})
+    return delta
+
+
+def unmoved(sequence: List[int]) -> set:
+    """positions of a longest increasing subsequence of sequence. The
+    matched blocks outside of it are the ones that moved."""
+    tails = []  # value of the smallest tail of each subsequence length
+    tails_pos = []
+    parents = [-1] * len(sequence)
+    for pos, value in enumerate(sequence):
+        i = bisect_left(tails, value)
+        if i == len(tails):
+            tails.append(value)
+            tails_pos.append(pos)
+        else:
+            tails[i] = value
+            tails_pos[i] = pos
+        parents[pos] = tails_pos[i - 1] if i else -1
+    kept = set()
+    pos = tails_pos[-1] if tails_pos else -1
+    while pos != -1:
+        kept.add(pos)
+        pos = parents[pos]
+    return kept
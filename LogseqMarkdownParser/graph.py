@@ -0,0 +1,472 @@
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Union, Callable, Optional, Iterator, Tuple, Any
+from pathlib import Path, PosixPath
+
+# only use beartype if its installed
+try:
+    from beartype import beartype as typechecker
+except Exception:
+    def typechecker(func: Callable) -> Callable:
+        return func
+
+# if used in a tqdm loop, it's annoying to have the prints appear
+# if tqdm is found, use it instead
+try:
+    from tqdm import tqdm
+    def print(x):
+        tqdm.write(str(x))
+except Exception:
+    pass
+
+from .pages import LogseqPage
+from .timeindex import LogseqTimeIndex
+from .search import LogseqSearchIndex
+from .prefilter import Prefilter, matches_prefilter
+from .names import LogseqPageNameIndex, decode_page_name
+
+
+@typechecker
+class LogseqPageProxy:
+    """Lightweight stand-in for a page of a LogseqGraph created with
+    lazy=True. The file is only parsed when an attribute of the page is
+    accessed, and the parsed LogseqPage lives in the LRU cache of the graph
+    so it can be evicted and parsed again later. Every attribute and method
+    of LogseqPage can be used on the proxy.
+
+    Don't keep references to the LogseqPage returned by load for long:
+    edits made to an evicted page are not seen by the graph.
+
+    Attributes:
+        - path
+        - is_loaded
+
+    Methods:
+        - load
+        - pin
+        - unpin
+    """
+    __slots__ = ("_graph", "path")
+
+    def __init__(self, graph: "LogseqGraph", path: Path) -> None:
+        object.__setattr__(self, "_graph", graph)
+        object.__setattr__(self, "path", path)
+
+    def load(self) -> LogseqPage:
+        "returns the parsed page, parsing it if it's not in the cache"
+        return self._graph._get_cached(self.path)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.path in self._graph._cache
+
+    def pin(self) -> None:
+        "load the page and never evict it until unpin is called"
+        self.load()
+        self._graph._pinned.add(self.path)
+
+    def unpin(self) -> None:
+        self._graph._pinned.discard(self.path)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.load(), name, value)
+
+    def __str__(self) -> str:
+        return str(self.load())
+
+    def __repr__(self) -> str:
+        return f"LogseqPageProxy({self.path})"
+
+
+@typechecker
+class LogseqGraph:
+    """Loads the markdown pages of a Logseq graph directory.
+
+    Attributes:
+        - graph_dir
+            path to the root of the graph (the folder containing 'pages'
+            and 'journals')
+        - pages
+            dict mapping the path of each markdown file to its LogseqPage
+        - time_index
+            LogseqTimeIndex of the logbook clocks and SCHEDULED/DEADLINE
+            dates of all pages, built on first access then kept up to date
+        - search_index
+            LogseqSearchIndex of the words of all the blocks, built on first
+            access then kept up to date
+        - name_index
+            LogseqPageNameIndex of all the files of the graph, parsed or not,
+            built on first access then kept up to date. The title:: property
+            overrides the file name for the pages that were parsed.
+        - load_stats
+            dict with the number of files parsed, skipped by the
+            prefilter and that failed to parse during the latest call to
+            load, and an estimation
+            of the time saved by not parsing the skipped files
+        - cache_stats
+            if lazy is True: dict with the hits, misses, evictions,
+            writebacks and the current size of the page cache. A hit is
+            counted when a page is taken from the cache instead of being
+            parsed, consecutive accesses to the same page count once.
+
+    Methods:
+        - iter_files
+        - load
+        - load_file
+        - remove_file
+        - page_name
+        - get_page
+        - page_hashes
+        - root_hash
+        - iter_pages
+    """
+
+    def __init__(
+        self,
+        graph_dir: Union[str, PosixPath],
+        subdirs: Tuple[str, ...] = ("pages", "journals"),
+        load: bool = True,
+        prefilter: Optional[Prefilter] = None,
+        lazy: bool = False,
+        max_pages: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        writeback: bool = False,
+        verbose: bool = False,
+    ) -> None:
+        """
+        graph_dir: path to the graph
+
+        subdirs: the folders of the graph that contain pages
+
+        load: bool, default True
+            if False, no file is parsed until load or load_file is called
+
+        prefilter: default None
+            files that don't match it are not parsed at all,
+            see matches_prefilter for the accepted values
+
+        lazy: bool, default False
+            if True, self.pages contains LogseqPageProxy objects that only
+            parse their file when used. The parsed pages are kept in an LRU
+            cache bounded by max_pages and max_bytes so that going over
+            the whole graph uses a bounded amount of memory.
+
+        max_pages: int, default None
+            maximum number of parsed pages kept in the cache if lazy is True
+
+        max_bytes: int, default None
+            maximum total size of the files of the parsed pages kept in the
+            cache if lazy is True. The size of the file is used as an
+            approximation of the memory used by the page.
+
+        writeback: bool, default False
+            if True, modified pages are saved to their file when they are
+            evicted from the cache. Otherwise they stay in the cache until
+            saved with export_to and are not evicted: writeback is then
+            needed for the cache to stay within max_pages and max_bytes
+            when many pages are modified. A message is printed the first
+            time the budget can't be met.
+
+        verbose: bool, default False
+        """
+        self.graph_dir = Path(graph_dir)
+        assert self.graph_dir.exists(), f"Dir not found: {graph_dir}"
+        self.subdirs = subdirs
+        self.prefilter = prefilter
+        self.lazy = lazy
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.writeback = writeback
+        self.verbose = verbose
+        self._cache = OrderedDict()  # path -> (page, size, state at parsing)
+        self._pinned = set()
+        self._warned_budget = False
+        self.cache_stats = {
+            "hits": 0, "misses": 0, "evictions": 0, "writebacks": 0,
+            "n_pages": 0, "n_bytes": 0,
+        }
+        self.pages = {}
+        self.load_stats = {}
+        self._time_index = None
+        self._search_index = None
+        self._name_index = None
+        if load:
+            self.load()
+
+    def iter_files(self) -> Iterator[Path]:
+        "yields the path of every markdown file of the graph"
+        for subdir in self.subdirs:
+            folder = self.graph_dir / subdir
+            if not folder.exists():
+                continue
+            for f in sorted(folder.iterdir()):
+                if f.suffix == ".md" and f.is_file():
+                    yield f
+
+    def load(self, paths: Optional[list] = None) -> None:
+        """parse every markdown file of the graph that matches the prefilter.
+        If paths is given, only those files are parsed, for example the
+        ones selected by a LogseqDateIndex."""
+        self.pages = {}
+        self._cache.clear()
+        self._pinned.clear()
+        self.cache_stats["n_pages"] = self.cache_stats["n_bytes"] = 0
+        self._time_index = None
+        self._search_index = None
+        self._name_index = None
+        stats = {
+            "n_files": 0,
+            "n_parsed": 0,
+            "n_skipped": 0,
+            "n_failed": 0,
+            "bytes_parsed": 0,
+            "bytes_skipped": 0,
+            "prefilter_time": 0.0,
+            "parse_time": 0.0,
+        }
+        files = self.iter_files() if paths is None else [Path(p) for p in paths]
+        for f in files:
+            stats["n_files"] += 1
+            try:
+                parsed = self._load_one(f, stats)
+            except FileNotFoundError:
+                # deleted since it was listed
+                stats["n_skipped"] += 1
+                continue
+            except Exception as err:
+                # one malformed page must not prevent loading the graph
+                stats["n_failed"] += 1
+                if self.verbose:
+                    print(f"Failed to parse {f}: '{err}'")
+                continue
+            if parsed:
+                stats["n_parsed"] += 1
+            else:
+                stats["n_skipped"] += 1
+
+        # assume that parsing time is proportional to the file size
+        parse_speed = stats["parse_time"] / max(stats["bytes_parsed"], 1)
+        stats["estimated_time_saved"] = (
+            parse_speed * stats["bytes_skipped"] - stats["prefilter_time"])
+        self.load_stats = stats
+        if self.verbose:
+            print(
+                f"Loaded {stats['n_parsed']} pages from {self.graph_dir}, "
+                f"skipped {stats['n_skipped']} files, failed to parse "
+                f"{stats['n_failed']}, saving about "
+                f"{stats['estimated_time_saved']:.3f}s")
+
+    def _load_one(self, f: Path, stats: dict) -> bool:
+        """prefilter then parse a file for load, updating stats. Returns
+        False if the file was skipped"""
+        size = f.stat().st_size
+        if self.prefilter is not None:
+            t = time.perf_counter()
+            matched = matches_prefilter(f, self.prefilter)
+            stats["prefilter_time"] += time.perf_counter() - t
+            if not matched:
+                stats["bytes_skipped"] += size
+                return False
+        t = time.perf_counter()
+        try:
+            page = self._parse_file(f)
+        finally:
+            stats["parse_time"] += time.perf_counter() - t
+        if page is None:  # deleted since it was listed
+            return False
+        stats["bytes_parsed"] += size
+        return True
+
+    def load_file(self, path: Union[str, PosixPath]) -> Union[LogseqPage, LogseqPageProxy, None]:
+        """(re)parse a single file of the graph and store it in self.pages.
+        Returns None if the file disappeared in the meantime or does not
+        match the prefilter anymore."""
+        path = Path(path)
+        try:
+            if self.prefilter is not None and not matches_prefilter(path, self.prefilter):
+                self.remove_file(path)
+                return None
+        except FileNotFoundError:
+            self.remove_file(path)
+            return None
+        return self._parse_file(path)
+
+    def _parse_file(self, path: Path) -> Union[LogseqPage, LogseqPageProxy, None]:
+        if self.lazy:
+            if not path.exists():
+                self.remove_file(path)
+                return None
+            # the file changed on disk: forget the cached version
+            self._uncache(path)
+            page = LogseqPageProxy(self, path)
+            self.pages[path] = page
+            if self._name_index is not None:
+                self._name_index.add(path)
+            if self._time_index is not None:
+                self._time_index.update_page(self.page_name(path), self._loaded(page))
+            if self._search_index is not None:
+                self._search_index.update_page(self.page_name(path), self._loaded(page))
+            return page
+        try:
+            content = path.read_text()
+        except FileNotFoundError:
+            self.remove_file(path)
+            return None
+        page = LogseqPage(content=content, verbose=False)
+        self.pages[path] = page
+        if self._name_index is not None:
+            self._name_index.add(path, title=page.page_properties.get("title"))
+        if self._time_index is not None:
+            self._time_index.update_page(self.page_name(path), self._loaded(page))
+        if self._search_index is not None:
+            self._search_index.update_page(self.page_name(path), page)
+        return page
+
+    def remove_file(self, path: Union[str, PosixPath]) -> None:
+        "forget about a file, for example because it was deleted"
+        self.pages.pop(Path(path), None)
+        self._uncache(Path(path))
+        if self._name_index is not None:
+            self._name_index.remove(path)
+        if self._time_index is not None:
+            self._time_index.remove_page(self.page_name(path))
+        if self._search_index is not None:
+            self._search_index.remove_page(self.page_name(path))
+
+    @property
+    def time_index(self) -> LogseqTimeIndex:
+        "index of the clocks and dates of every page"
+        if self._time_index is None:
+            self._time_index = LogseqTimeIndex()
+            for path, page in self.pages.items():
+                self._time_index.update_page(self.page_name(path), self._loaded(page))
+        return self._time_index
+
+    @property
+    def search_index(self) -> LogseqSearchIndex:
+        """full text index of the blocks of every page. With lazy=True, the
+        indexed blocks are kept in memory even if their page is evicted."""
+        if self._search_index is None:
+            self._search_index = LogseqSearchIndex()
+            for path, page in self.pages.items():
+                self._search_index.update_page(self.page_name(path), self._loaded(page))
+        return self._search_index
+
+    @property
+    def name_index(self) -> LogseqPageNameIndex:
+        "index of the names of every file of the graph"
+        if self._name_index is None:
+            self._name_index = LogseqPageNameIndex()
+            for path in self.iter_files():
+                page = self.pages.get(path)
+                title = None
+                if isinstance(page, LogseqPage):
+                    title = page.page_properties.get("title")
+                self._name_index.add(path, title=title)
+        return self._name_index
+
+    def page_name(self, path: Union[str, PosixPath]) -> str:
+        "name of the page stored at path, decoded from its file name"
+        return decode_page_name(Path(path).stem)
+
+    def get_page(self, name: str) -> Union[LogseqPage, LogseqPageProxy, None]:
+        "returns the parsed page that has that name, None if not found"
+        path = self.name_index.get(name)
+        if path is None:
+            return None
+        return self.pages.get(path)
+
+    def page_hashes(self) -> dict:
+        "dict of page name to the root_hash of the page"
+        return {
+            self.page_name(path): page.root_hash
+            for path, page in self.pages.items()
+        }
+
+    @property
+    def root_hash(self) -> str:
+        "hash of all the parsed pages of the graph"
+        h = hashlib.blake2b(digest_size=16)
+        for name, page_hash in sorted(self.page_hashes().items()):
+            h.update(f"|{name}:{page_hash}".encode())
+        return h.hexdigest()
+
+    def iter_pages(self) -> Iterator[Tuple[str, Union[LogseqPage, LogseqPageProxy]]]:
+        """yields (page name, page) for every page. With lazy=True, each
+        page is loaded through the cache so memory stays bounded as long as
+        the pages are not kept by the caller."""
+        for path in list(self.pages):
+            page = self.pages.get(path)
+            if page is None:
+                continue
+            yield self.page_name(path), self._loaded(page)
+
+    @staticmethod
+    def _loaded(page: Union[LogseqPage, LogseqPageProxy]) -> LogseqPage:
+        return page.load() if isinstance(page, LogseqPageProxy) else page
+
+    def _is_dirty(self, path: Path) -> bool:
+        page, _, fingerprint = self._cache[path]
+        saved = page._saved_fingerprint
+        if saved is not None and saved[0].resolve() == path.resolve():
+            # saved to its file with export_to since it was parsed
+            fingerprint = saved[1]
+        return page._fingerprint() != fingerprint
+
+    def _get_cached(self, path: Path) -> LogseqPage:
+        if path in self._cache:
+            # each attribute access of a proxy goes through here, only
+            # count a hit when the page was not the latest one used
+            if next(reversed(self._cache)) != path:
+                self._cache.move_to_end(path)
+                self.cache_stats["hits"] += 1
+            return self._cache[path][0]
+        self.cache_stats["misses"] += 1
+        page = LogseqPage(content=path.read_text(), verbose=False)
+        size = path.stat().st_size
+        self._cache[path] = (page, size, page._fingerprint())
+        self.cache_stats["n_pages"] += 1
+        self.cache_stats["n_bytes"] += size
+        self._evict()
+        return page
+
+    def _uncache(self, path: Path) -> None:
+        entry = self._cache.pop(path, None)
+        self._pinned.discard(path)
+        if entry is not None:
+            self.cache_stats["n_pages"] -= 1
+            self.cache_stats["n_bytes"] -= entry[1]
+
+    def _over_budget(self) -> bool:
+        return (
+            (self.max_pages is not None and self.cache_stats["n_pages"] > self.max_pages)
+            or (self.max_bytes is not None and self.cache_stats["n_bytes"] > self.max_bytes)
+        )
+
+    def _evict(self) -> None:
+        "evict the least recently used pages until the cache fits its budget"
+        if not self._over_budget():
+            return
+        # the most recently used page is never evicted
+        for path in list(self._cache)[:-1]:
+            if not self._over_budget():
+                break
+            if path in self._pinned:
+                continue
+            if self._is_dirty(path):
+                if not self.writeback:
+                    continue  # kept until saved
+                self._cache[path][0].export_to(path, overwrite=True, allow_empty=True)
+                self.cache_stats["writebacks"] += 1
+            self._uncache(path)
+            self.cache_stats["evictions"] += 1
+        if self._over_budget() and not self._warned_budget:
+            self._warned_budget = True
+            print(
+                "The page cache is over its budget because of pinned or "
+                "modified pages. Modified pages are only evicted if "
+                "writeback is True, otherwise save them with export_to.")
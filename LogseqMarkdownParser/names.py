@@ -0,0 +1,114 @@
+from bisect import bisect_left, insort
+from urllib.parse import unquote
+from typing import Union, Callable, Optional, List, Tuple
+from pathlib import Path, PosixPath
+
+# only use beartype if its installed
+try:
+    from beartype import beartype as typechecker
+except Exception:
+    def typechecker(func: Callable) -> Callable:
+        return func
+
+
+def decode_page_name(file_stem: str) -> str:
+    """turn the name of a file (without .md) into the name of the page, using
+    the Logseq conventions: '___' separates namespaces and special
+    characters are url encoded (e.g. '%2F' for '/')"""
+    return unquote(file_stem.replace("___", "/"))
+
+
+@typechecker
+class LogseqPageNameIndex:
+    """Sorted index of page names to file paths, for prefix and namespace
+    queries in O(log n + number of results) instead of listing and filtering
+    the whole directory.
+
+    Names are compared case insensitively, like in Logseq. The name of a
+    page is decoded from its filename unless a title (usually the title::
+    page property) is given.
+
+    Methods:
+        - add
+        - remove
+        - rename
+        - get
+        - prefix
+        - namespace
+    """
+
+    def __init__(self) -> None:
+        self._sorted = []  # sorted list of (lowercase name, name, path)
+        self._by_path = {}  # path -> (lowercase name, name, path)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def add(
+        self,
+        path: Union[str, PosixPath],
+        title: Optional[str] = None,
+    ) -> None:
+        "add a file to the index, or update it if already present"
+        path = Path(path)
+        name = title if title else decode_page_name(path.stem)
+        entry = (name.lower(), name, path)
+        old = self._by_path.get(path)
+        if old == entry:
+            return
+        if old is not None:
+            self.remove(path)
+        insort(self._sorted, entry)
+        self._by_path[path] = entry
+
+    def remove(self, path: Union[str, PosixPath]) -> None:
+        "remove a file from the index, if present"
+        entry = self._by_path.pop(Path(path), None)
+        if entry is None:
+            return
+        i = bisect_left(self._sorted, entry)
+        assert self._sorted[i] == entry, "page name index is inconsistent"
+        del self._sorted[i]
+
+    def rename(
+        self,
+        old_path: Union[str, PosixPath],
+        new_path: Union[str, PosixPath],
+        title: Optional[str] = None,
+    ) -> None:
+        "update the index after a file was renamed"
+        self.remove(old_path)
+        self.add(new_path, title=title)
+
+    def get(self, name: str) -> Optional[Path]:
+        "path of the page with that name, None if not found"
+        lower = name.lower()
+        i = bisect_left(self._sorted, (lower,))
+        if i < len(self._sorted) and self._sorted[i][0] == lower:
+            return self._sorted[i][2]
+        return None
+
+    def prefix(self, prefix: str) -> List[Tuple[str, Path]]:
+        "(name, path) of every page whose name starts with prefix, sorted by name"
+        lower = prefix.lower()
+        found = []
+        i = bisect_left(self._sorted, (lower,))
+        while i < len(self._sorted) and self._sorted[i][0].startswith(lower):
+            found.append(self._sorted[i][1:])
+            i += 1
+        return found
+
+    def namespace(
+        self,
+        namespace: str,
+        include_self: bool = False,
+    ) -> List[Tuple[str, Path]]:
+        """(name, path) of every page inside the namespace, at any depth.
+        If include_self is True the page of the namespace itself is
+        also returned"""
+        found = self.prefix(namespace.rstrip("/") + "/")
+        if include_self:
+            path = self.get(namespace)
+            if path is not None:
+                found.insert(0, self._by_path[path][1:])
+        return found
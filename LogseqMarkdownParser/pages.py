@@ -1,5 +1,8 @@
-import textwrap
-from typing import Union, Any, Callable
+import hashlib
+import pickle
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import Union, Any, Callable, List, Optional, Tuple, Iterator
 from pathlib import Path, PosixPath
 import re
 import json
@@ -22,6 +25,105 @@ except Exception:
     pass
 
 from .blocks import LogseqBlock
+from .checks import should_check, CHECK_LEVELS
+from .snapshot import LogseqPageSnapshot, _render_page, _shift_indentation
+from .diff import LogseqPageDiff, body_hash, properties_delta, unmoved
+from .serialize import pack_page, unpack_page, Buffer
+
+
+PAGE_PROP_REGEX = re.compile(r"(\w[\w_-]*\w:: .+)")
+
+
+def _parse_page_properties(pageprop: str) -> dict:
+    "parse the text located before the first block into a dict"
+    page_properties = {}
+    prop = re.findall(PAGE_PROP_REGEX, pageprop)
+    for found in prop:
+        assert found == found.lstrip(), f"Incorrect page property? {found}"
+        try:
+            key, value = found.split(":: ")
+            page_properties[key.strip()] = value.strip()
+        except ValueError:
+            # probably failed because it was not a property but a long line that contained ::
+            raise Exception(f"Failed to parse page property: {found}")
+    return page_properties
+
+
+def _split_page(content: str) -> Tuple[str, List[str]]:
+    """split the text of a page into the text located before the first
+    block and the list of the text of each block"""
+    content = content.strip()
+
+    # detect each block (read each line then merge with the latest block)
+    lines = content.split("\n")
+
+    # convert any leading * to -
+    lines = [
+        li.replace("* ", "- ", 1) if li.lstrip().startswith("* ") else li
+        for li in lines
+    ]
+
+    assert lines[0].lstrip().startswith("-") or lines[0].lstrip().startswith("#") or ":: " in lines[0] or (len(lines) == 1 and not lines[0].strip()
+                                                                      ), (
+                "First line of document must start with '[ \t]*- ' or '[ \t]*#' or contain a page property or the document must be empty"
+    )
+    lines = [li for li in lines if li.strip()]  # remove empty lines
+    pageprop = ""  # as string first
+    first_block_reached = False
+    for i, line in enumerate(lines):
+        if not line.strip():
+            lines[i] = None
+        elif not line.lstrip().startswith("- "):  # it's a property or content
+            if not first_block_reached:  # page property
+                pageprop += lines[i] + "\n"
+                lines[i] = None
+            else:  # block content
+                ii = 0
+                while True:
+                    ii += 1
+                    if lines[i-ii] is not None:
+                        lines[i-ii] += "\n" + line
+                        lines[i] = None
+                        break
+                    if i-ii <= 0:
+                        raise Exception("Endless loop")
+        else:
+            first_block_reached = True
+
+    blocks = [line for line in lines if line is not None]
+
+    if blocks:
+        assert first_block_reached
+    return pageprop, blocks
+
+
+def _split_page_raw(content: str) -> Tuple[str, List[str]]:
+    """same split as _split_page but the text is kept verbatim: returns
+    the text before the first block and the text of each block, including
+    its line ends and the blank lines that follow it. Joining them gives
+    back content."""
+    lines = content.split("\n")
+    texts = [""]
+    for i, line in enumerate(lines):
+        if line.lstrip().startswith(("- ", "* ")):
+            texts.append("")
+        texts[-1] += line if i == len(lines) - 1 else line + "\n"
+    return texts[0], texts[1:]
+
+
+def read_page_properties(file_path: Union[str, PosixPath]) -> dict:
+    """returns the page properties of a .md file, same as
+    LogseqPage.page_properties, but only reads the file up to its
+    first block"""
+    pageprop = ""
+    with open(file_path, "r") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.lstrip().startswith(("- ", "* ")):
+                break
+            if line.strip():
+                pageprop += line + "\n"
+    return _parse_page_properties(pageprop)
 
 
 @typechecker
@@ -33,6 +135,8 @@ class LogseqPage:
             list of LogseqBlock objects
         - page_properties
             can be edited like a normal dict, as opposed to the block properties
+        - lossless
+            if True, export_to keeps the original text of unmodified blocks
         - __VERSION__
             version of the LogseqMarkdownParser
 
@@ -41,89 +145,191 @@ class LogseqPage:
         - format
         - export_to
         - set_property
+        - set_properties
         - del_property
+        - del_properties
+        - subtree
+        - extract_subtree
+        - insert_subtree
+        - move_subtree
+        - transaction
+        - validate
+        - snapshot
+        - subtree_hashes
+        - root_hash
+        - changed_subtrees
+        - diff
+        - apply_patch
+        - from_blocks (classmethod)
+        - from_records (classmethod)
+        - to_bytes
+        - from_bytes (classmethod)
 
     """
-    PAGE_PROP_REGEX = re.compile(r"(\w[\w_-]*\w:: .+)")
+    PAGE_PROP_REGEX = PAGE_PROP_REGEX
 
     def __init__(
         self,
-        content: str,
+        content: Optional[str] = None,
         check_parsing: bool = False,
         verbose: bool = False,
+        lazy_blocks: bool = False,
+        file_path: Optional[Union[str, PosixPath]] = None,
+        check_level: Optional[str] = None,
+        lossless: bool = False,
     ) -> None:
+        """
+        content: the text of the page. Can be None if file_path is given.
+
+        check_parsing: bool, default False
+            if True, check that the page reformed from the parsed blocks
+            is the same as the content
+
+        verbose: bool, default False
+
+        lazy_blocks: bool, default False
+            if True, only the page properties are parsed at first and
+            the blocks are parsed when self.blocks is first accessed.
+            If content is None, only the start of the file up to the
+            first block is read until then.
+
+        file_path: path to the .md file, used if content is None
+
+        check_level: str, default None
+            'off', 'basic' or 'paranoid': how much internal consistency
+            checking is done by the page and its blocks. None to use the
+            global level, see set_check_level.
+
+        lossless: bool, default False
+            if True, the original text of each block is kept and export_to
+            writes it back verbatim (blank lines, '* ', spaces, non
+            breaking spaces etc) unless the block was modified. Same for
+            the text before the first block unless page_properties was
+            modified. An unmodified page is then saved byte for byte
+            identical to its source.
+        """
         self.verbose = verbose
-        assert isinstance(content, str), (
-            f"content must be of type string, not '{type(content)}'")
+        assert check_level is None or check_level in CHECK_LEVELS, (
+            f"check_level must be None or one of {CHECK_LEVELS}, not {check_level}")
+        self.check_level = check_level
+        self.lossless = lossless
+        self._source_prefix = None  # verbatim text before the first block
+        self._source_suffix = ""  # line ends at the end of the source file
+        self._source_properties = None  # page_properties when parsed
+        self._saved_fingerprint = None  # (path, self._fingerprint()) at the last export_to
+        self._transaction_depth = 0
+        self._transaction_others = {}  # id -> (page, state) of move_subtree targets
+        self._hash_cache = (None, None)
+        self.check_parsing = check_parsing
+        self._file_path = Path(file_path) if file_path is not None else None
+        self._blocks = None
+        if content is None:
+            assert file_path is not None, "content or file_path must be given"
+            if not lazy_blocks:
+                content = self._file_path.read_text()
+        else:
+            assert isinstance(content, str), (
+                f"content must be of type string, not '{type(content)}'")
+        self._source = content if lazy_blocks else None  # kept until the blocks are parsed
 
-        content = content.strip()
+        if content is None:
+            self.page_properties = read_page_properties(self._file_path)
+        else:
+            pageprop, block_strs = _split_page(content)
+            # the property of the whole page have to be stored separately
+            self.page_properties = _parse_page_properties(pageprop)
+        if lossless:
+            self._source_properties = dict(self.page_properties)
+        if content is not None and not lazy_blocks:
+            self._parse_blocks(block_strs, content)
 
-        # detect each block (read each line then merge with the latest block)
-        lines = content.split("\n")
+    @classmethod
+    def from_blocks(
+        cls,
+        blocks: List[LogseqBlock],
+        page_properties: Optional[dict] = None,
+        validate: bool = False,
+        verbose: bool = False,
+        check_level: Optional[str] = None,
+    ) -> "LogseqPage":
+        """create a page from existing LogseqBlock objects without turning
+        them into text and parsing them again, so they keep their UUID.
+        The blocks are not copied: remove them from their previous page
+        first, for example with extract_subtree.
+        If validate is True, the page is checked with self.validate."""
+        page = cls(content="", verbose=verbose, check_level=check_level)
+        page.page_properties = dict(page_properties) if page_properties else {}
+        page.blocks = list(blocks)
+        if validate:
+            page.validate()
+        return page
 
-        # convert any leading * to -
-        lines = [
-            li.replace("* ", "- ", 1) if li.lstrip().startswith("* ") else li
-            for li in lines
+    @classmethod
+    def from_records(
+        cls,
+        records: List[dict],
+        validate: bool = False,
+        verbose: bool = False,
+        check_level: Optional[str] = None,
+    ) -> "LogseqPage":
+        """create a page from the output of self.format('list_of_dict'),
+        or of self.format('json') once loaded with json.loads.
+        If validate is False, the block contents are trusted and only
+        parsed when their values are accessed. Otherwise each record is
+        checked against its content (see LogseqBlock.from_dict) and
+        the page with self.validate."""
+        page_properties = {}
+        if records and "block_content" not in records[0]:
+            page_properties = records[0]
+            records = records[1:]
+        blocks = [
+            LogseqBlock.from_dict(
+                record,
+                check_level=check_level,
+                validate=validate,
+            )
+            for record in records
         ]
-
-        assert lines[0].lstrip().startswith("-") or lines[0].lstrip().startswith("#") or ":: " in lines[0] or (len(lines) == 1 and not lines[0].strip()
-                                                                          ), (
-                    "First line of document must start with '[ \t]*- ' or '[ \t]*#' or contain a page property or the document must be empty"
+        return cls.from_blocks(
+            blocks=blocks,
+            page_properties=page_properties,
+            validate=validate,
+            verbose=verbose,
+            check_level=check_level,
         )
-        lines = [li for li in lines if li.strip()]  # remove empty lines
-        pageprop = ""  # as string first
-        first_block_reached = False
-        for i, line in enumerate(lines):
-            if not line.strip():
-                lines[i] = None
-            elif not line.lstrip().startswith("- "):  # it's a property or content
-                if not first_block_reached:  # page property
-                    pageprop += lines[i] + "\n"
-                    lines[i] = None
-                else:  # block content
-                    ii = 0
-                    while True:
-                        ii += 1
-                        if lines[i-ii] is not None:
-                            lines[i-ii] += "\n" + line
-                            lines[i] = None
-                            break
-                        if i-ii <= 0:
-                            raise Exception("Endless loop")
-            else:
-                first_block_reached = True
 
-        blocks = [line for line in lines if line is not None]
-
-        if blocks:
-            assert first_block_reached
+    @property
+    def blocks(self) -> list:
+        "list of LogseqBlock of the page, parsed on first access if lazy_blocks was used"
+        if self._blocks is None:
+            content = self._source
+            if content is None:
+                content = self._file_path.read_text()
+            _, block_strs = _split_page(content)
+            self._parse_blocks(block_strs, content)
+            self._source = None
+        return self._blocks
 
-        self.page_properties = {}  # the property of the whole page have to be stored separately
-        prop = re.findall(self.PAGE_PROP_REGEX, pageprop)
-        for found in prop:
-            assert found == found.lstrip(), f"Incorrect page property? {found}"
-            try:
-                key, value = found.split(":: ")
-                self.page_properties[key.strip()] = value.strip()
-            except ValueError:
-                # probably failed because it was not a property but a long line that contained ::
-                raise Exception(f"Failed to parse page property: {found}")
+    @blocks.setter
+    def blocks(self, new: list) -> None:
+        self._blocks = new
 
+    def _parse_blocks(self, blocks: List[str], content: str) -> None:
         if self.verbose:
             print(f"Number of blocks in text: {len(blocks)}")
 
         # parse each block
-        self.blocks = []
+        self._blocks = []
+        paranoid = should_check(self.check_level, "paranoid")
         for index, block_str in enumerate(blocks):
-            assert isinstance(
-                block_str, str), f"block is not string: '{block_str}'"
             block = LogseqBlock(
                 content=block_str,
                 verbose=self.verbose,
+                check_level=self.check_level,
             )
-            assert block.content == block_str.replace(u"\xa0", u" "), (
-                "block content modifying unexpectedly")
+            if paranoid:
+                assert block.content == block_str.replace(u"\xa0", u" "), (
+                    "block content modifying unexpectedly")
 
             if self.verbose:
                 print("\n\n---------------------------------\n")
@@ -134,10 +340,60 @@ class LogseqPage:
                 print(f"* properties: {block.properties}")
                 print(f"* UUID: {block.UUID}")
 
-            self.blocks.append(block)
+            self._blocks.append(block)
+
+        if self.lossless:
+            self._keep_source(content)
 
-        if not check_parsing:
+        if self.check_parsing:
+            self._check_parsing(content.strip())
+
+    def _fingerprint(self) -> tuple:
+        """what is compared to know if the page was modified: each change of
+        a block gives it a new version"""
+        return (
+            tuple((id(b), b._blockvalues["version"]) for b in self.blocks),
+            dict(self.page_properties),
+        )
+
+    def _keep_source(self, content: str) -> None:
+        "remember the verbatim text of each block, for lossless export"
+        prefix, block_texts = _split_page_raw(content)
+        if len(block_texts) != len(self._blocks):
+            if self.verbose:
+                print("Could not split the page verbatim, lossless is disabled")
+            self.lossless = False
             return
+        self._source_prefix = prefix
+        self._source_suffix = content[len(content.rstrip("\n")):]
+        for block, text in zip(self._blocks, block_texts):
+            block._blockvalues["source"] = (block._blockvalues["version"], text)
+
+    def _lossless_text(self) -> str:
+        """the text of the page where the unmodified blocks are in their
+        original form, see the lossless argument"""
+        if self.page_properties == self._source_properties:
+            parts = [self._source_prefix]
+        else:
+            parts = [f"{k}:: {v}\n" for k, v in self.page_properties.items()]
+        rendered = False
+        for block in self.blocks:
+            source = block._blockvalues.get("source")
+            rendered = source is None or source[0] != block._blockvalues["version"]
+            if rendered:
+                text = str(block).replace("    ", "\t")
+            else:
+                text = source[1]
+            if parts and parts[-1] and not parts[-1].endswith("\n"):
+                parts.append("\n")
+            parts.append(text)
+        if rendered:
+            # keep the file ending of the source
+            parts[-1] = parts[-1].rstrip("\n") + self._source_suffix
+        return "".join(parts)
+
+    def _check_parsing(self, content: str) -> None:
+        "raise an exception if the reformed page differs from content"
         reformed = self.content
         content = "\n".join([li for li in content.split("\n") if li.strip()])
         if reformed.replace(u"\xa0", u" ") != content.replace(u"\xa0", u" "):
@@ -175,30 +431,11 @@ class LogseqPage:
         Note that the leading spaces are not replaced by tabs, so logseq might
         overwrite them badly so use self.export_to instead if you want to save
         the file to Logseq"""
-        temp = "\n".join(
-            [f"{k}:: {v}" for k, v in self.page_properties.items()])
-        if self.blocks:
-            if temp:
-                temp += "\n"
-            latest_UUID = self.blocks[-1].UUID
-
-            for block in self.blocks:
-                assert str(block).lstrip().startswith("-")
-                bil = block.indentation_level
-                if not bil % 4 == 0:
-                    newbil = (1 + bil // 4) * 4
-                    if self.verbose:
-                        print(
-                            "block has an indentation level not "
-                            f"divisible by 4: '{bil % 4}' in block {block}. "
-                            f"setting indentation to {newbil}")
-                    block.indentation_level = newbil
-                temp += str(block)
-                if block.UUID != latest_UUID:
-                    temp += "\n"
-        temp = textwrap.dedent(temp)
-        temp = temp.strip()
-        return temp
+        return _render_page(
+            self.page_properties,
+            [(str(block), block.indentation_level) for block in self.blocks],
+            verbose=self.verbose,
+            check=should_check(self.check_level, "basic"))
 
     @content.setter
     def content(self, new: str) -> None:
@@ -211,47 +448,598 @@ class LogseqPage:
         The key must be a string and the value will be cast as string.
         You can edit self.page_properties as a regular dict instead of using this method.
         """
-        try:
-            value = str(value)
-        except Exception as err:
-            raise Exception(
-                f"Failed to parse as string: '{value}' (err:{err})")
-        self.page_properties[key] = value
+        self.set_properties({key: value})
+
+    def set_properties(self, properties: dict) -> None:
+        """
+        Set several page properties at once.
+        The keys must be strings and the values will be cast as string.
+        """
+        new_props = {}
+        for key, value in properties.items():
+            assert isinstance(key, str), f"key must be a string, not {type(key)}"
+            try:
+                new_props[key] = str(value)
+            except Exception as err:
+                raise Exception(
+                    f"Failed to parse as string: '{value}' (err:{err})")
+        self.page_properties.update(new_props)
 
     def del_property(self, key: str) -> None:
         """
         The key must be a string and the value will be cast as string.
         You can edit self.page_properties as a regular dict instead of using this method.
         """
-        assert key in self.page_properties, (
-            f"No {key} found in page_properties key so can't delete it")
-        del self.page_properties[key]
+        self.del_properties([key])
+
+    def del_properties(self, keys: list) -> None:
+        "Delete several page properties at once."
+        for key in keys:
+            assert key in self.page_properties, (
+                f"No {key} found in page_properties key so can't delete it")
+        for key in keys:
+            del self.page_properties[key]
+
+    def _index_of(self, block: LogseqBlock) -> int:
+        "index of the block in self.blocks, compared by identity"
+        for i, b in enumerate(self.blocks):
+            if b is block:
+                return i
+        raise ValueError(f"Block not found in page: {block}")
+
+    def _subtree_end(self, index: int) -> int:
+        "index right after the last child of the block at index"
+        level = self.blocks[index].indentation_level
+        end = index + 1
+        n_blocks = len(self.blocks)
+        while end < n_blocks and self.blocks[end].indentation_level > level:
+            end += 1
+        return end
+
+    def subtree(self, block: LogseqBlock) -> List[LogseqBlock]:
+        "returns the block followed by all its children, without modifying the page"
+        start = self._index_of(block)
+        return self.blocks[start:self._subtree_end(start)]
+
+    def extract_subtree(self, block: LogseqBlock) -> List[LogseqBlock]:
+        """remove the block and all its children from the page and return
+        them in order. Their indentation is left untouched."""
+        start = self._index_of(block)
+        end = self._subtree_end(start)
+        subtree = self.blocks[start:end]
+        del self.blocks[start:end]
+        return subtree
+
+    def insert_subtree(
+        self,
+        blocks: List[LogseqBlock],
+        target: Optional[LogseqBlock] = None,
+        position: str = "last_child",
+    ) -> None:
+        """
+        Insert a list of blocks (for example returned by extract_subtree,
+        possibly from another page) relative to the target block in a single
+        splice.
+        The whole list is shifted by the same indentation offset so that its
+        first block ends up at the right level, the relative indentation
+        of the blocks is kept.
+
+        position can be:
+            - 'before': as the previous sibling of target
+            - 'after': as the next sibling of target, after target's children
+            - 'first_child': as the first child of target
+            - 'last_child': as the last child of target
+        If target is None, the blocks are inserted at the top level, at the
+        start of the page for 'before' and 'first_child' and at the end
+        otherwise.
+        """
+        assert position in ["before", "after", "first_child", "last_child"], (
+            f"Invalid position: {position}")
+        if not blocks:
+            return
+
+        if target is None:
+            new_level = 0
+            if position in ["before", "first_child"]:
+                index = 0
+            else:
+                index = len(self.blocks)
+        else:
+            assert not any(b is target for b in blocks), (
+                "Cannot insert a subtree relative to one of its own blocks")
+            target_index = self._index_of(target)
+            target_level = target.indentation_level
+            if position == "before":
+                index = target_index
+                new_level = target_level
+            elif position == "after":
+                index = self._subtree_end(target_index)
+                new_level = target_level
+            elif position == "first_child":
+                index = target_index + 1
+                new_level = target_level + 4
+            else:
+                index = self._subtree_end(target_index)
+                new_level = target_level + 4
+
+        offset = new_level - blocks[0].indentation_level
+        if offset:
+            for block in blocks:
+                block.indentation_level = block.indentation_level + offset
+        self.blocks[index:index] = blocks
+
+    def move_subtree(
+        self,
+        block: LogseqBlock,
+        target: Optional[LogseqBlock] = None,
+        position: str = "last_child",
+        target_page: Optional["LogseqPage"] = None,
+    ) -> None:
+        """
+        Move the block and all its children relative to the target block.
+        If target_page is given, the target is looked up in that page
+        instead, which moves the subtree across pages.
+        See insert_subtree for the meaning of position.
+        """
+        if target_page is None:
+            target_page = self
+        if self._transaction_depth and target_page is not self:
+            # restored too if the transaction fails
+            key = id(target_page)
+            if key not in self._transaction_others:
+                self._transaction_others[key] = (target_page, target_page._save_state())
+        if target is not None and target_page is self:
+            assert not any(b is target for b in self.subtree(block)), (
+                "Cannot move a block relative to one of its children")
+        subtree = self.extract_subtree(block)
+        target_page.insert_subtree(
+            blocks=subtree,
+            target=target,
+            position=position,
+        )
+
+    def snapshot(self) -> LogseqPageSnapshot:
+        """
+        Returns an immutable copy of the page that can be read from many
+        threads without locks while this page keeps being edited (by a
+        single writer thread).
+        The snapshots of the blocks are cached on each block so successive
+        snapshots share the blocks that did not change and only the
+        modified blocks are copied.
+        """
+        return LogseqPageSnapshot(
+            page_properties=MappingProxyType(dict(self.page_properties)),
+            blocks=tuple(block.snapshot() for block in self.blocks),
+        )
+
+    def _tree(self) -> Tuple[List[int], List[List[int]]]:
+        """returns the indexes of the top level blocks and the list of the
+        indexes of the direct children of each block"""
+        roots = []
+        children = [[] for _ in self.blocks]
+        stack = []  # (level, index) of the current ancestors
+        for i, block in enumerate(self.blocks):
+            level = block.indentation_level
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            if stack:
+                children[stack[-1][1]].append(i)
+            else:
+                roots.append(i)
+            stack.append((level, i))
+        return roots, children
+
+    def subtree_hashes(self) -> List[str]:
+        """
+        Returns, for each block of self.blocks, a hash of the block and all
+        its children (a Merkle tree). Two subtrees have the same hash if
+        their content and relative indentation are the same.
+        The hashes of the block contents are cached on each block and the
+        result is cached until a block is modified, added or removed.
+        """
+        key = tuple((id(b), b._blockvalues["version"]) for b in self.blocks)
+        if self._hash_cache[0] == key:
+            return self._hash_cache[1]
+        _, children = self._tree()
+        levels = [b.indentation_level for b in self.blocks]
+        hashes = [None] * len(self.blocks)
+        # the children are always after their parent
+        for i in range(len(self.blocks) - 1, -1, -1):
+            h = hashlib.blake2b(self.blocks[i].content_hash.encode(), digest_size=16)
+            for c in children[i]:
+                h.update(f"|{levels[c] - levels[i]}:{hashes[c]}".encode())
+            hashes[i] = h.hexdigest()
+        self._hash_cache = (key, hashes)
+        return hashes
+
+    @property
+    def root_hash(self) -> str:
+        "hash of the page properties and of all the blocks"
+        roots, _ = self._tree()
+        hashes = self.subtree_hashes()
+        h = hashlib.blake2b(
+            json.dumps(self.page_properties, sort_keys=True).encode(),
+            digest_size=16,
+        )
+        for r in roots:
+            h.update(f"|{hashes[r]}".encode())
+        return h.hexdigest()
+
+    def changed_subtrees(self, other: "LogseqPage") -> List[LogseqBlock]:
+        """
+        Compare with another version of the page and return the blocks of
+        self whose subtree has no identical counterpart in other.
+        Identical subtrees are skipped without looking inside them, and a
+        block whose own content did not change is not reported itself:
+        only its changed children are.
+        """
+        hashes = self.subtree_hashes()
+        other_hashes = other.subtree_hashes()
+        roots, children = self._tree()
+        other_roots, other_children = other._tree()
+
+        changed = []
+
+        def compare(indexes: List[int], other_indexes: List[int]) -> None:
+            other_set = {other_hashes[j] for j in other_indexes}
+            by_content = {}
+            for j in other_indexes:
+                by_content.setdefault(other.blocks[j].content_hash, j)
+            for i in indexes:
+                if hashes[i] in other_set:
+                    continue
+                # same block among the siblings: look inside it
+                j = by_content.get(self.blocks[i].content_hash)
+                if j is not None:
+                    compare(children[i], other_children[j])
+                else:
+                    changed.append(self.blocks[i])
+
+        compare(roots, other_roots)
+        return changed
+
+    def diff(self, other: "LogseqPage") -> LogseqPageDiff:
+        """
+        Compare self (the old version) to other (the new version) block by
+        block and return a LogseqPageDiff.
+        Blocks are matched by UUID first, then by content_hash (so
+        independently of their indentation), then by their content without
+        the property lines to find the blocks whose properties changed.
+        The unmatched blocks are deleted or inserted, and the matched blocks
+        that are out of order are reported as moved.
+        """
+        old_blocks, new_blocks = self.blocks, other.blocks
+        match = {}  # old index -> new index
+
+        by_uuid = {}
+        for j, block in enumerate(new_blocks):
+            by_uuid.setdefault(block.UUID, []).append(j)
+        for i, block in enumerate(old_blocks):
+            found = by_uuid.get(block.UUID)
+            if found and len(found) == 1:
+                match[i] = found.pop()
+        matched_new = set(match.values())
+
+        for key in (lambda b: b.content_hash, body_hash):
+            queues = {}
+            for j, block in enumerate(new_blocks):
+                if j not in matched_new:
+                    queues.setdefault(key(block), []).append(j)
+            for queue in queues.values():
+                queue.reverse()
+            for i, block in enumerate(old_blocks):
+                if i in match:
+                    continue
+                queue = queues.get(key(block))
+                if queue:
+                    match[i] = queue.pop()
+                    matched_new.add(match[i])
+
+        pairs = sorted(match.items())
+        kept = unmoved([j for _, j in pairs])
+        moved = [pair for pos, pair in enumerate(pairs) if pos not in kept]
+        reindented = []
+        properties_changed = []
+        edited = []
+        edits = {}  # old index -> patch item
+        for i, j in pairs:
+            old, new = old_blocks[i], new_blocks[j]
+            item = {}
+            if old.indentation_level != new.indentation_level:
+                reindented.append((i, j, old.indentation_level, new.indentation_level))
+                item["level"] = new.indentation_level
+            if old.content_hash != new.content_hash:
+                delta = properties_delta(dict(old.properties), dict(new.properties))
+                if delta and body_hash(old) == body_hash(new):
+                    properties_changed.append((i, j, delta))
+                    # check that setting the properties gives the same text
+                    trial = LogseqBlock(content=old.content, check_level="off")
+                    trial.set_properties({k: v for k, v in delta.items() if v is not None})
+                    trial.del_properties([k for k, v in delta.items() if v is None])
+                    if trial.content_hash == new.content_hash:
+                        item["props"] = delta
+                    else:
+                        item["content"] = new.content
+                else:
+                    edited.append((i, j))
+                    item["content"] = new.content
+            if item:
+                item["i"] = i
+                edits[i] = item
+
+        # blocks of the new page in order: ranges of unchanged old blocks,
+        # changed old blocks and the content of inserted blocks
+        old_of_new = {j: i for i, j in match.items()}
+        items = []
+        for j, block in enumerate(new_blocks):
+            i = old_of_new.get(j)
+            if i is None:
+                items.append(block.content)
+            elif i in edits:
+                items.append(edits[i])
+            elif items and isinstance(items[-1], list) and items[-1][1] == i:
+                items[-1][1] = i + 1
+            else:
+                items.append([i, i + 1])
+
+        page_delta = properties_delta(self.page_properties, other.page_properties)
+        return LogseqPageDiff(
+            inserted=[j for j in range(len(new_blocks)) if j not in matched_new],
+            deleted=[i for i in range(len(old_blocks)) if i not in match],
+            moved=moved,
+            reindented=reindented,
+            properties_changed=properties_changed,
+            edited=edited,
+            page_properties_changed=page_delta,
+            patch={
+                "base": self.root_hash,
+                "page_properties": page_delta,
+                "blocks": items,
+            },
+        )
+
+    def apply_patch(self, patch: dict) -> None:
+        """
+        Apply in place the patch of a LogseqPageDiff, made by diff, to the
+        page it was computed from. The unchanged blocks are kept as is.
+        The 'blocks' of a patch is a list containing, in the order of the
+        new page:
+            - [start, stop]: the old blocks from start to stop (excluded)
+            - a string: the content of an inserted block
+            - a dict: the old block of index 'i', with its new indentation
+              'level', its changed 'props' ({key: value or None to delete})
+              or its whole new 'content'
+        """
+        if should_check(self.check_level, "basic"):
+            assert patch["base"] == self.root_hash, (
+                "The patch was not made from this version of the page")
+        old_blocks = self.blocks
+        blocks = []
+        for item in patch["blocks"]:
+            if isinstance(item, list):
+                blocks.extend(old_blocks[item[0]:item[1]])
+            elif isinstance(item, str):
+                blocks.append(LogseqBlock(
+                    content=item,
+                    verbose=self.verbose,
+                    check_level=self.check_level,
+                ))
+            else:
+                block = old_blocks[item["i"]]
+                if "content" in item:
+                    block.content = item["content"]
+                if "props" in item:
+                    props = item["props"]
+                    block.set_properties({k: v for k, v in props.items() if v is not None})
+                    block.del_properties([k for k, v in props.items() if v is None])
+                if "level" in item:
+                    block.indentation_level = item["level"]
+                blocks.append(block)
+        for key, value in patch["page_properties"].items():
+            if value is None:
+                self.page_properties.pop(key, None)
+            else:
+                self.page_properties[key] = value
+        self.blocks = blocks
+
+    def validate(self, level: Optional[str] = None) -> None:
+        """
+        Check the consistency of the whole page, raising an AssertionError
+        if something is wrong. level defaults to the check level of the page:
+            - off: nothing is checked
+            - basic: each block starts with '- ' and has a valid indentation
+            - paranoid: the page is also reformed and parsed again and must
+              give the same blocks
+        """
+        if level is None:
+            level = self.check_level
+        if not should_check(level, "basic"):
+            return
+        for block in self.blocks:
+            assert isinstance(block, LogseqBlock), f"Not a LogseqBlock: {block}"
+            assert str(block).lstrip().startswith("- "), (
+                f"block content must start with '- ': '{block}'")
+            assert block.indentation_level >= 0, (
+                f"invalid indentation level for block '{block}'")
+        if not should_check(level, "paranoid"):
+            return
+        for block in self.blocks:
+            block._get_properties()  # raises if a property is malformed
+        _, block_strs = _split_page(self.content)
+        assert len(block_strs) == len(self.blocks), (
+            f"Reparsing the page gave {len(block_strs)} blocks instead of {len(self.blocks)}")
+
+    @contextmanager
+    def transaction(self) -> Iterator["LogseqPage"]:
+        """
+        Context manager to apply many edits to the page at once:
+
+            with page.transaction():
+                page.move_subtree(...)
+                block.set_property(...)
+
+        The per operation checks of the blocks present at the start are
+        turned off until the end of the transaction, then the whole page is
+        validated once (see validate).
+        If an exception is raised inside the block or by the validation,
+        the blocks, their content and the page properties are restored
+        to their state from the start of the transaction. This includes
+        the pages that received blocks through move_subtree.
+        Nested transactions are merged into the outermost one.
+        """
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield self
+            finally:
+                self._transaction_depth -= 1
+            return
+
+        saved = self._save_state()
+        for block in saved[0]:
+            block.check_level = "off"
+
+        self._transaction_depth = 1
+        self._transaction_others = {}
+        try:
+            yield self
+            for block, _, _, check_level in saved[2]:
+                block.check_level = check_level
+            self.validate()
+        except BaseException:
+            self._restore_state(saved)
+            for other, other_saved in self._transaction_others.values():
+                other._restore_state(other_saved)
+            raise
+        finally:
+            self._transaction_depth = 0
+            self._transaction_others = {}
+        self._hash_cache = (None, None)
+
+    def _save_state(self) -> tuple:
+        "what transaction needs to restore the page"
+        # the content strings are immutable so shallow copies are enough
+        blocks = list(self.blocks)
+        return (
+            blocks,
+            dict(self.page_properties),
+            [
+                (block, dict(block._blockvalues), block._changed, block.check_level)
+                for block in blocks
+            ],
+        )
+
+    def _restore_state(self, saved: tuple) -> None:
+        blocks, page_properties, states = saved
+        self.blocks = blocks
+        self.page_properties = page_properties
+        for block, blockvalues, changed, check_level in states:
+            block._blockvalues = blockvalues
+            block._cache = {}
+            block._changed = changed
+            block.check_level = check_level
+        self._hash_cache = (None, None)
+
+    def to_bytes(self) -> bytes:
+        """
+        Compact binary encoding of the page, to load back with from_bytes.
+        The text of all the blocks is stored in a single buffer with
+        arrays of offsets instead of one object per block, so it is much
+        faster to create and to load than the default pickle.
+        It is also what pickle uses for LogseqPage, for example
+        to send pages between processes.
+        """
+        meta = {
+            "page_properties": self.page_properties,
+            "verbose": self.verbose,
+            "check_level": self.check_level,
+            "check_parsing": self.check_parsing,
+            "file_path": str(self._file_path) if self._file_path is not None else None,
+        }
+        blocks = self.blocks
+        return pack_page(
+            meta=meta,
+            contents=[b.content for b in blocks],
+            uuids=[b._blockvalues["UUID"] for b in blocks],
+            changed=[b._changed for b in blocks],
+        )
+
+    @classmethod
+    def from_bytes(cls, data: Union[Buffer, pickle.PickleBuffer]) -> "LogseqPage":
+        """create a page from the output of to_bytes. The block contents
+        are trusted and only parsed when their values are accessed."""
+        if isinstance(data, pickle.PickleBuffer):
+            data = data.raw()
+        meta, contents, uuids, changed = unpack_page(data)
+        blocks = LogseqBlock._trusted(
+            contents=contents,
+            uuids=uuids,
+            check_level=meta["check_level"],
+            verbose=meta["verbose"],
+        )
+        for block, flag in zip(blocks, changed):
+            if flag:
+                block._changed = True
+        page = cls.from_blocks(
+            blocks=blocks,
+            page_properties=meta["page_properties"],
+            verbose=meta["verbose"],
+            check_level=meta["check_level"],
+        )
+        page.check_parsing = meta["check_parsing"]
+        if meta["file_path"] is not None:
+            page._file_path = Path(meta["file_path"])
+        return page
+
+    def __reduce_ex__(self, protocol: int) -> tuple:
+        "pickle the page as to_bytes, out of band with protocol 5"
+        data = self.to_bytes()
+        if protocol >= 5:
+            data = pickle.PickleBuffer(data)
+        return (self.__class__.from_bytes, (data,))
 
     def export_to(
         self,
         file_path: Union[str, PosixPath],
         overwrite: bool = False,
         allow_empty: bool = False,
-    ) -> None:
+    ) -> bool:
         """
         export the blocks to file_path
         Note that the leading spaces are replaced by tabs, so Logeq will not
         overwrite them (and sometimes badly!).
+        If the page was parsed with lossless=True, the unmodified blocks are
+        written as they were in the source.
+        The file is not touched if it already has the same content.
+        Returns True if the file was written.
         """
+        file_path = Path(file_path)
+        exists = file_path.exists()
         if not overwrite:
-            if Path(file_path).exists():
+            if exists:
                 raise Exception(
                     "file_path already exists, use the overwrite argument")
 
-        cont = self.content
-
-        cont = cont.replace("    ", "\t")
+        self.blocks  # parse them if lazy, lossless might then be disabled
+        if self.lossless:
+            cont = self._lossless_text()
+        else:
+            cont = self.content
+            cont = cont.replace("    ", "\t")
 
-        if not cont:
+        if not cont.strip():
             assert allow_empty, "Can't save an empty file if allow_empty is False"
 
+        if exists:
+            data = cont.encode()
+            if file_path.stat().st_size == len(data) and file_path.read_bytes() == data:
+                self._saved_fingerprint = (file_path, self._fingerprint())
+                return False
+
         with open(file_path, "w") as f:
             f.write(cont)
+        self._saved_fingerprint = (file_path, self._fingerprint())
+        return True
 
     def __str__(self) -> str:
         return self.content
@@ -287,3 +1075,57 @@ class LogseqPage:
             "blocks": [b.dict() for b in self.blocks],
         }
         return d
+
+
+def append_blocks(
+    file_path: Union[str, PosixPath],
+    blocks: List[LogseqBlock],
+    tail_size: int = 4096,
+) -> None:
+    """append blocks at the end of a .md file in a single write, without
+    reading or parsing the rest of the file. Useful for archive pages
+    that only grow.
+
+    Each subtree is added as a top level block: a block that is not
+    deeper than the previous root starts a new subtree and the indentation
+    of its root is removed from all its blocks. The indentation is written with tabs like
+    export_to does, unless the end of the file is indented with spaces.
+    Only the last tail_size bytes of the file are read to know that and
+    whether a newline must be added first. The file is created if missing.
+    """
+    if not blocks:
+        return
+    file_path = Path(file_path)
+    lines = []
+    root_level = blocks[0].indentation_level
+    for block in blocks:
+        level = block.indentation_level
+        if level <= root_level:
+            root_level = level
+        # the blocks are not modified, only their text
+        content = block.content
+        if root_level:
+            content = _shift_indentation(content, -root_level)
+        lines.append(content.rstrip())
+    text = "\n".join(lines).strip()
+
+    tail = b""
+    if file_path.exists():
+        with open(file_path, "rb") as f:
+            f.seek(0, 2)
+            f.seek(max(0, f.tell() - tail_size))
+            tail = f.read()
+    # the first line of the tail can be cut in the middle
+    indented = [
+        li for li in tail.split(b"\n")[1:]
+        if li.startswith((b" ", b"\t")) and li.strip()
+    ]
+    if not indented or indented[-1].startswith(b"\t"):
+        text = text.replace("    ", "\t")
+    else:
+        text = re.sub(r"(?m)^\t+", lambda m: "    " * len(m.group(0)), text)
+
+    if tail.strip() and not tail.endswith(b"\n"):
+        text = "\n" + text
+    with open(file_path, "a") as f:
+        f.write(text)
@@ -0,0 +1,70 @@
+import re
+import mmap
+from typing import Union, Callable, List
+from pathlib import Path, PosixPath
+
+from .pages import read_page_properties
+
+# a prefilter can be:
+#   - a str or bytes: the file must contain it
+#   - a compiled bytes regex: it must match somewhere in the file
+#   - a callable: it is called with the page properties and must return True
+#   - a list of the above: all of them must be satisfied
+Prefilter = Union[str, bytes, re.Pattern, Callable, List]
+
+
+def matches_prefilter(
+    file_path: Union[str, PosixPath],
+    prefilter: Prefilter,
+) -> bool:
+    """
+    Check a file against a prefilter without decoding or parsing it.
+    Substrings and regexes are searched in the raw bytes of the file through
+    mmap, page properties predicates only read the file up to its first
+    block.
+    """
+    if not isinstance(prefilter, list):
+        prefilter = [prefilter]
+    if not prefilter:
+        return True
+
+    byte_filters = []
+    prop_filters = []
+    for pf in prefilter:
+        if isinstance(pf, str):
+            byte_filters.append(pf.encode())
+        elif isinstance(pf, bytes):
+            byte_filters.append(pf)
+        elif isinstance(pf, re.Pattern):
+            assert isinstance(pf.pattern, bytes), (
+                f"regex prefilters must be compiled from bytes: {pf}")
+            byte_filters.append(pf)
+        elif callable(pf):
+            prop_filters.append(pf)
+        else:
+            raise ValueError(f"Invalid prefilter: {pf}")
+
+    if byte_filters:
+        with open(file_path, "rb") as f:
+            if Path(file_path).stat().st_size == 0:
+                data = b""  # empty files can't be mmaped
+            else:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for bf in byte_filters:
+                    if isinstance(bf, bytes):
+                        if data.find(bf) == -1:
+                            return False
+                    elif bf.search(data) is None:
+                        return False
+            finally:
+                if isinstance(data, mmap.mmap):
+                    data.close()
+
+    if prop_filters:
+        props = read_page_properties(file_path)
+        for pf in prop_filters:
+            if not pf(props):
+                return False
+
+    return True
@@ -0,0 +1,326 @@
+import re
+import math
+import pickle
+from array import array
+from bisect import bisect_left
+from typing import Callable, Optional, List, Tuple, Dict
+
+# only use beartype if its installed
+try:
+    from beartype import beartype as typechecker
+except Exception:
+    def typechecker(func: Callable) -> Callable:
+        return func
+
+from .pages import LogseqPage
+from .blocks import LogseqBlock, add_content_hook
+
+TOKEN_REGEX = re.compile(r"\w+")
+# a quoted phrase, or a term optionally ending with * for a prefix query,
+# both optionally negated with a leading -
+QUERY_REGEX = re.compile(r'(-?)"([^"]*)"|(-?)(\S+)')
+
+# approximate memory used by the postings, in bytes
+POSTING_SIZE = 64  # for each (term, block) pair
+POSITION_SIZE = 4  # for each position
+
+
+def tokenize(text: str) -> List[str]:
+    "lowercase words of the text, in order"
+    return TOKEN_REGEX.findall(text.lower())
+
+
+@typechecker
+class LogseqSearchIndex:
+    """Inverted index of the words of the blocks of several pages, with the
+    position of each word in the block for phrase queries.
+
+    Pages are added with update_page. The blocks whose content is modified
+    afterwards are reindexed before the next search, the blocks added to or
+    removed from a page are only seen after update_page is called again.
+
+    Queries (words are case insensitive):
+        - python typing: blocks containing both words
+        - "type hints": blocks containing the phrase
+        - pars*: words starting with 'pars'
+        - python OR rust: blocks matching either side
+        - python -snake: blocks containing python but not snake
+    Results are ranked by tf-idf.
+
+    If max_bytes is set and the estimated size of the index goes over it,
+    the positions of the most frequent words are dropped. Phrases containing
+    them are then checked by reading the content of the candidate blocks.
+
+    Methods:
+        - update_page
+        - remove_page
+        - search
+        - to_bytes
+        - from_bytes (classmethod)
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None) -> None:
+        self.max_bytes = max_bytes
+        self._docs = {}  # doc id -> (page name, block)
+        self._doc_of = {}  # id(block) -> doc id
+        self._doc_terms = {}  # doc id -> number of tokens of each term
+        self._page_docs = {}  # page name -> list of doc ids
+        self._postings = {}  # term -> {doc id: array of positions or None}
+        self._no_positions = set()  # terms whose positions were dropped
+        self._n_bytes = 0
+        self._next_doc = 0
+        self._dirty = set()
+        self._sorted_terms = None
+        add_content_hook(self._on_content_change)
+
+    def __len__(self) -> int:
+        "number of indexed blocks"
+        return len(self._docs)
+
+    @property
+    def n_bytes(self) -> int:
+        "approximate size of the postings in bytes"
+        return self._n_bytes
+
+    def _on_content_change(self, block: LogseqBlock) -> None:
+        doc = self._doc_of.get(id(block))
+        if doc is not None:
+            self._dirty.add(doc)
+
+    def _add_terms(self, doc: int, content: str) -> None:
+        positions = {}
+        for pos, term in enumerate(tokenize(content)):
+            positions.setdefault(term, []).append(pos)
+        for term, pos in positions.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._sorted_terms = None
+            if term in self._no_positions:
+                postings[doc] = None
+                self._n_bytes += POSTING_SIZE
+            else:
+                postings[doc] = array("I", pos)
+                self._n_bytes += POSTING_SIZE + POSITION_SIZE * len(pos)
+        self._doc_terms[doc] = {term: len(pos) for term, pos in positions.items()}
+
+    def _remove_terms(self, doc: int) -> None:
+        for term in self._doc_terms.pop(doc, {}):
+            postings = self._postings[term]
+            positions = postings.pop(doc)
+            self._n_bytes -= POSTING_SIZE
+            if positions is not None:
+                self._n_bytes -= POSITION_SIZE * len(positions)
+            if not postings:
+                del self._postings[term]
+                self._no_positions.discard(term)
+                self._sorted_terms = None
+
+    def _enforce_budget(self) -> None:
+        "drop the positions of the largest posting lists until under max_bytes"
+        if self.max_bytes is None or self._n_bytes <= self.max_bytes:
+            return
+        sizes = sorted(
+            (
+                (sum(len(p) for p in postings.values()), term)
+                for term, postings in self._postings.items()
+                if term not in self._no_positions
+            ),
+            reverse=True,
+        )
+        for size, term in sizes:
+            if self._n_bytes <= self.max_bytes:
+                break
+            postings = self._postings[term]
+            for doc in postings:
+                postings[doc] = None
+            self._no_positions.add(term)
+            self._n_bytes -= POSITION_SIZE * size
+
+    def update_page(self, name: str, page: LogseqPage) -> None:
+        """index the blocks of the page, or update them if the page was
+        already indexed. Unchanged blocks are not tokenized again."""
+        self._refresh()
+        old_docs = {id(self._docs[d][1]): d for d in self._page_docs.get(name, [])}
+        docs = []
+        for block in page.blocks:
+            doc = old_docs.pop(id(block), None)
+            if doc is None:
+                doc = self._next_doc
+                self._next_doc += 1
+                self._docs[doc] = (name, block)
+                self._doc_of[id(block)] = doc
+                self._add_terms(doc, block.content)
+            docs.append(doc)
+        for doc in old_docs.values():
+            self._remove_doc(doc)
+        self._page_docs[name] = docs
+        self._enforce_budget()
+
+    def _remove_doc(self, doc: int) -> None:
+        self._remove_terms(doc)
+        _, block = self._docs.pop(doc)
+        self._doc_of.pop(id(block), None)
+
+    def remove_page(self, name: str) -> None:
+        "forget about a page, if present"
+        for doc in self._page_docs.pop(name, []):
+            self._remove_doc(doc)
+
+    def _refresh(self) -> None:
+        "reindex the blocks whose content changed"
+        if not self._dirty:
+            return
+        for doc in self._dirty:
+            if doc in self._docs:
+                self._remove_terms(doc)
+                self._add_terms(doc, self._docs[doc][1].content)
+        self._dirty.clear()
+        self._enforce_budget()
+
+    def _expand(self, item: str) -> List[str]:
+        "the indexed terms matching a word or a prefix ending with *"
+        if not item.endswith("*"):
+            return [item]
+        prefix = item[:-1]
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        found = []
+        i = bisect_left(self._sorted_terms, prefix)
+        while i < len(self._sorted_terms) and self._sorted_terms[i].startswith(prefix):
+            found.append(self._sorted_terms[i])
+            i += 1
+        return found
+
+    def _match_terms(self, item: str) -> Dict[int, float]:
+        "doc id -> tf-idf score of the blocks containing a word or prefix"
+        scores = {}
+        n_docs = len(self._docs)
+        for term in self._expand(item):
+            postings = self._postings.get(term, {})
+            if not postings:
+                continue
+            idf = math.log(1 + n_docs / len(postings))
+            for doc in postings:
+                tf = self._doc_terms[doc][term]
+                scores[doc] = scores.get(doc, 0.0) + (1 + math.log(tf)) * idf
+        return scores
+
+    def _match_phrase(self, words: List[str]) -> Dict[int, float]:
+        "doc id -> score of the blocks containing the words in that order"
+        if not words:
+            return {}
+        if len(words) == 1:
+            return self._match_terms(words[0])
+        postings = [self._postings.get(w, {}) for w in words]
+        if not all(postings):
+            return {}
+        candidates = set.intersection(*(set(p) for p in postings))
+        idf = sum(math.log(1 + len(self._docs) / len(p)) for p in postings)
+        scores = {}
+        for doc in candidates:
+            if any(w in self._no_positions for w in words):
+                tokens = tokenize(self._docs[doc][1].content)
+                starts = [
+                    i for i in range(len(tokens) - len(words) + 1)
+                    if tokens[i:i + len(words)] == words
+                ]
+            else:
+                following = [set(p[doc]) for p in postings[1:]]
+                starts = [
+                    start for start in postings[0][doc]
+                    if all(start + 1 + i in f for i, f in enumerate(following))
+                ]
+            if starts:
+                scores[doc] = (1 + math.log(len(starts))) * idf
+        return scores
+
+    def search(
+        self,
+        query: str,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[str, LogseqBlock, float]]:
+        "(page name, block, score) of the blocks matching the query, best first"
+        self._refresh()
+        results = {}
+        for clause in re.split(r"\s+OR\s+", query.strip()):
+            scores = None
+            excluded = set()
+            for neg_phrase, phrase, neg_word, word in QUERY_REGEX.findall(clause):
+                if phrase or not word:
+                    negated = bool(neg_phrase)
+                    matched = self._match_phrase(tokenize(phrase))
+                elif word.endswith("*"):
+                    negated = bool(neg_word)
+                    matched = self._match_terms(word.lower())
+                else:
+                    negated = bool(neg_word)
+                    matched = self._match_phrase(tokenize(word))
+                if negated:
+                    excluded.update(matched)
+                elif scores is None:
+                    scores = matched
+                else:
+                    scores = {
+                        doc: score + matched[doc]
+                        for doc, score in scores.items() if doc in matched
+                    }
+            for doc, score in (scores or {}).items():
+                if doc not in excluded:
+                    results[doc] = max(results.get(doc, 0.0), score)
+        ranked = sorted(results.items(), key=lambda x: (-x[1], x[0]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(*self._docs[doc], score) for doc, score in ranked]
+
+    def to_bytes(self) -> bytes:
+        """serialize the index. The blocks are stored as their position in
+        their page and content_hash, see from_bytes."""
+        self._refresh()
+        positions = {}
+        for name, docs in self._page_docs.items():
+            for i, doc in enumerate(docs):
+                positions[doc] = (name, i, self._docs[doc][1].content_hash)
+        return pickle.dumps({
+            "max_bytes": self.max_bytes,
+            "docs": positions,
+            "doc_terms": self._doc_terms,
+            "postings": self._postings,
+            "no_positions": self._no_positions,
+            "next_doc": self._next_doc,
+        }, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def from_bytes(
+        cls,
+        data: bytes,
+        pages: Dict[str, LogseqPage],
+    ) -> "LogseqSearchIndex":
+        """load an index made by to_bytes for those pages (page name ->
+        LogseqPage). The blocks that changed since, and the pages that were
+        not in the index, are indexed again."""
+        state = pickle.loads(data)
+        index = cls(max_bytes=state["max_bytes"])
+        index._doc_terms = state["doc_terms"]
+        index._postings = state["postings"]
+        index._no_positions = state["no_positions"]
+        index._next_doc = state["next_doc"]
+        index._n_bytes = sum(
+            POSTING_SIZE + (POSITION_SIZE * len(p) if p is not None else 0)
+            for postings in index._postings.values() for p in postings.values()
+        )
+        stale = []
+        for doc, (name, i, content_hash) in state["docs"].items():
+            page = pages.get(name)
+            if page is None or i >= len(page.blocks) or page.blocks[i].content_hash != content_hash:
+                stale.append(doc)
+                continue
+            block = page.blocks[i]
+            index._docs[doc] = (name, block)
+            index._doc_of[id(block)] = doc
+            index._page_docs.setdefault(name, []).append(doc)
+        for doc in stale:
+            index._remove_terms(doc)
+        for name, page in pages.items():
+            index.update_page(name, page)
+        return index
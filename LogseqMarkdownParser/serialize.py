@@ -0,0 +1,70 @@
+import sys
+import json
+import struct
+from array import array
+from typing import List, Tuple, Union
+
+# binary layout of a page, all integers are little endian:
+#   header: magic, format version, number of blocks, size of the metadata,
+#           number of characters of the text
+#   metadata: utf-8 json with the page properties and attributes
+#   offsets: 2 * n_blocks + 1 uint64, the character offsets of the content
+#            then the UUID of each block inside the text
+#   changed: 1 byte per block, the _changed flag of the block
+#   text: utf-8, the contents and UUIDs of every block concatenated
+HEADER = struct.Struct("<4sBQQQ")
+MAGIC = b"LSMP"
+FORMAT_VERSION = 1
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def pack_page(
+    meta: dict,
+    contents: List[str],
+    uuids: List[str],
+    changed: List[bool],
+) -> bytes:
+    "encode a page as bytes, see unpack_page"
+    parts = []
+    for content, uuid in zip(contents, uuids):
+        parts.append(content)
+        parts.append(uuid)
+    offsets = array("Q", [0])
+    total = 0
+    for part in parts:
+        total += len(part)
+        offsets.append(total)
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    meta = json.dumps(meta, ensure_ascii=False).encode()
+    return b"".join([
+        HEADER.pack(MAGIC, FORMAT_VERSION, len(contents), len(meta), total),
+        meta,
+        offsets.tobytes(),
+        bytes(changed),
+        "".join(parts).encode(),
+    ])
+
+
+def unpack_page(data: Buffer) -> Tuple[dict, List[str], List[str], bytes]:
+    """decode bytes made by pack_page, returns the metadata, the contents
+    and UUIDs of the blocks and their _changed flags"""
+    view = memoryview(data).cast("B")
+    magic, version, n_blocks, meta_size, _ = HEADER.unpack_from(view)
+    assert magic == MAGIC, "Not a serialized LogseqPage"
+    assert version == FORMAT_VERSION, f"Unsupported serialization format: {version}"
+    pos = HEADER.size
+    meta = json.loads(bytes(view[pos:pos + meta_size]))
+    pos += meta_size
+    offsets = array("Q")
+    offsets.frombytes(view[pos:pos + 8 * (2 * n_blocks + 1)])
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    pos += 8 * (2 * n_blocks + 1)
+    changed = bytes(view[pos:pos + n_blocks])
+    pos += n_blocks
+    text = str(view[pos:], "utf-8")  # decoded once, then sliced
+    contents = [text[offsets[2 * i]:offsets[2 * i + 1]] for i in range(n_blocks)]
+    uuids = [text[offsets[2 * i + 1]:offsets[2 * i + 2]] for i in range(n_blocks)]
+    return meta, contents, uuids, changed
@@ -0,0 +1,366 @@
+import os
+import sys
+import json
+import struct
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+from types import MappingProxyType
+from typing import Union, Callable, Optional, Iterator, List, Tuple
+from pathlib import Path, PosixPath
+
+# only use beartype if its installed
+try:
+    from beartype import beartype as typechecker
+except Exception:
+    def typechecker(func: Callable) -> Callable:
+        return func
+
+from .blocks import TODO_STATES
+from .snapshot import _render_page
+from .graph import LogseqGraph, LogseqPageProxy
+
+# layout of the shared memory, in native byte order:
+#   header: magic, format version, number of pages, number of blocks,
+#           size of the page table
+#   page table: utf-8 json list of [name, path, first block, number of
+#               blocks, page properties]
+#   text_offsets: uint64 * (2 * n_blocks + 1), byte offsets of the content
+#                 then of the UUID of each block in the text
+#   prop_offsets: uint64 * (n_blocks + 1), byte offsets of the json of the
+#                 properties of each block in the properties region
+#   levels: uint32 * n_blocks, the indentation level of each block
+#   states: uint8 * n_blocks, 0 if no TODO state, otherwise 1 + its index
+#           in TODO_STATES
+#   text: utf-8 contents and UUIDs of every block
+#   properties: utf-8 json of the properties of every block
+HEADER = struct.Struct("=4sBQQQ")
+MAGIC = b"LSMG"
+FORMAT_VERSION = 1
+
+# names of the shared memory created by this process, their resource
+# tracker registration belongs to create
+_CREATED = set()
+
+
+def _pad(size: int) -> int:
+    "round up to a multiple of 8 to keep the arrays aligned"
+    return (size + 7) // 8 * 8
+
+
+@typechecker
+class LogseqSharedBlockView:
+    """Read-only view of a block stored in a LogseqSharedGraph. The values
+    are read from the shared memory when accessed, nothing is copied
+    beforehand.
+
+    Attributes:
+        - content
+        - indentation_level
+        - TODO_state
+        - UUID
+        - properties
+
+    Methods:
+        - dict
+    """
+    __slots__ = ("_graph", "_index")
+
+    def __init__(self, graph: "LogseqSharedGraph", index: int) -> None:
+        self._graph = graph
+        self._index = index
+
+    @property
+    def content(self) -> str:
+        return self._graph._text(2 * self._index)
+
+    @property
+    def UUID(self) -> str:
+        return self._graph._text(2 * self._index + 1)
+
+    @property
+    def indentation_level(self) -> int:
+        return self._graph._levels[self._index]
+
+    @property
+    def TODO_state(self) -> Optional[str]:
+        state = self._graph._states[self._index]
+        return TODO_STATES[state - 1] if state else None
+
+    @property
+    def properties(self) -> MappingProxyType:
+        return MappingProxyType(self._graph._properties(self._index))
+
+    def dict(self) -> dict:
+        "same as LogseqBlock.dict"
+        return {
+            "block_properties": dict(self.properties),
+            "block_content": self.content,
+            "block_indentation_level": self.indentation_level,
+            "block_TODO_state": self.TODO_state,
+            "block_UUID": self.UUID,
+        }
+
+    def __str__(self) -> str:
+        return self.content
+
+    def __repr__(self) -> str:
+        return f"LogseqSharedBlockView({self.content})"
+
+
+@typechecker
+class LogseqSharedPageView:
+    """Read-only view of a page stored in a LogseqSharedGraph.
+
+    Attributes:
+        - name
+        - path
+        - page_properties
+        - blocks
+            tuple of LogseqSharedBlockView
+        - content
+
+    Methods:
+        - dict
+    """
+    __slots__ = ("_graph", "name", "path", "_first", "_n_blocks", "page_properties")
+
+    def __init__(self, graph: "LogseqSharedGraph", entry: list) -> None:
+        self._graph = graph
+        self.name, path, self._first, self._n_blocks, properties = entry
+        self.path = Path(path)
+        self.page_properties = MappingProxyType(properties)
+
+    @property
+    def blocks(self) -> Tuple[LogseqSharedBlockView, ...]:
+        return tuple(
+            LogseqSharedBlockView(self._graph, i)
+            for i in range(self._first, self._first + self._n_blocks)
+        )
+
+    @property
+    def content(self) -> str:
+        "same as LogseqPage.content"
+        return _render_page(
+            self.page_properties,
+            [(b.content, b.indentation_level) for b in self.blocks])
+
+    def dict(self) -> dict:
+        "same as LogseqPage.dict"
+        return {
+            "page_properties": dict(self.page_properties),
+            "page_content": self.content,
+            "blocks": [b.dict() for b in self.blocks],
+        }
+
+    def __str__(self) -> str:
+        return self.content
+
+    def __repr__(self) -> str:
+        return f"LogseqSharedPageView({self.name})"
+
+
+@typechecker
+class LogseqSharedGraph:
+    """Parsed graph stored once in shared memory so that several processes
+    can query it without each holding their own copy.
+
+    One process creates it with LogseqSharedGraph.create and keeps it
+    alive, then the worker processes attach to it by name with
+    LogseqSharedGraph.attach. The pages and blocks are returned as
+    read-only views that decode their values from the shared memory only
+    when accessed, so the memory of each worker stays small whatever the
+    size of the graph.
+
+    The creator must call unlink once the workers are done, every process
+    should call close.
+
+    Attributes:
+        - name
+            name of the shared memory block, to give to attach
+
+    Methods:
+        - create (classmethod)
+        - attach (classmethod)
+        - page_names
+        - get_page
+        - iter_pages
+        - find_blocks
+        - close
+        - unlink
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory) -> None:
+        "use create or attach instead"
+        self._shm = shm
+        self.name = shm.name
+        buf = shm.buf
+        magic, version, n_pages, n_blocks, table_size = HEADER.unpack_from(buf)
+        assert magic == MAGIC, "Not a LogseqSharedGraph"
+        assert version == FORMAT_VERSION, f"Unsupported shared graph format: {version}"
+        pos = HEADER.size
+        table = json.loads(bytes(buf[pos:pos + table_size]))
+        pos = _pad(pos + table_size)
+
+        def take(count: int, fmt: str, itemsize: int) -> memoryview:
+            nonlocal pos
+            view = buf[pos:pos + count * itemsize].cast(fmt)
+            pos = _pad(pos + count * itemsize)
+            return view
+
+        self._text_offsets = take(2 * n_blocks + 1, "Q", 8)
+        self._prop_offsets = take(n_blocks + 1, "Q", 8)
+        self._levels = take(n_blocks, "I", 4)
+        self._states = take(n_blocks, "B", 1)
+        self._text_region = buf[pos:pos + self._text_offsets[-1]]
+        pos += self._text_offsets[-1]
+        self._prop_region = buf[pos:pos + self._prop_offsets[-1]]
+        self._pages = {entry[0]: entry for entry in table}
+
+    @classmethod
+    def create(
+        cls,
+        graph: Union[LogseqGraph, str, PosixPath],
+        name: Optional[str] = None,
+    ) -> "LogseqSharedGraph":
+        """copy a LogseqGraph, or the graph found at that path, into a new
+        shared memory block. name is chosen randomly if None."""
+        if not isinstance(graph, LogseqGraph):
+            graph = LogseqGraph(graph_dir=graph)
+
+        table = []
+        texts = []
+        props = []
+        levels = []
+        states = []
+        for path, page in list(graph.pages.items()):
+            if isinstance(page, LogseqPageProxy):
+                page = page.load()
+            table.append([
+                graph.page_name(path),
+                str(path),
+                len(levels),
+                len(page.blocks),
+                dict(page.page_properties),
+            ])
+            for block in page.blocks:
+                texts.append(block.content.encode())
+                texts.append(block.UUID.encode())
+                properties = block.properties
+                props.append(json.dumps(properties, ensure_ascii=False).encode() if properties else b"")
+                levels.append(block.indentation_level)
+                state = block.TODO_state
+                states.append(TODO_STATES.index(state) + 1 if state else 0)
+
+        def offsets(parts: List[bytes]) -> bytes:
+            values = [0]
+            for part in parts:
+                values.append(values[-1] + len(part))
+            return struct.pack(f"={len(values)}Q", *values)
+
+        n_pages = len(table)
+        table = json.dumps(table, ensure_ascii=False).encode()
+        sections = [
+            HEADER.pack(MAGIC, FORMAT_VERSION, n_pages, len(levels), len(table)) + table,
+            offsets(texts),
+            offsets(props),
+            struct.pack(f"={len(levels)}I", *levels),
+            bytes(states),
+        ]
+        sections = [s + b"\x00" * (_pad(len(s)) - len(s)) for s in sections]
+        sections.append(b"".join(texts))
+        sections.append(b"".join(props))
+        size = sum(len(s) for s in sections)
+
+        shm = shared_memory.SharedMemory(name=name, create=True, size=max(size, 1))
+        _CREATED.add(shm.name)
+        pos = 0
+        for s in sections:
+            shm.buf[pos:pos + len(s)] = s
+            pos += len(s)
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name: str) -> "LogseqSharedGraph":
+        "open a shared graph created by another process"
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        else:
+            shm = shared_memory.SharedMemory(name=name)
+            # the processes started by multiprocessing share the resource
+            # tracker of their parent, the others start their own that would
+            # destroy the shared memory when this process exits
+            own_tracker = multiprocessing.parent_process() is None and shm.name not in _CREATED
+            if own_tracker and os.name == "posix":
+                resource_tracker.unregister("/" + shm.name, "shared_memory")
+        return cls(shm)
+
+    def _text(self, i: int) -> str:
+        start, end = self._text_offsets[i], self._text_offsets[i + 1]
+        return str(self._text_region[start:end], "utf-8")
+
+    def _properties(self, i: int) -> dict:
+        start, end = self._prop_offsets[i], self._prop_offsets[i + 1]
+        if start == end:
+            return {}
+        return json.loads(str(self._prop_region[start:end], "utf-8"))
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+    def page_names(self) -> List[str]:
+        return list(self._pages)
+
+    def get_page(self, name: str) -> Optional[LogseqSharedPageView]:
+        "the page with that name, None if not found"
+        entry = self._pages.get(name)
+        return LogseqSharedPageView(self, entry) if entry is not None else None
+
+    def iter_pages(self) -> Iterator[LogseqSharedPageView]:
+        for entry in self._pages.values():
+            yield LogseqSharedPageView(self, entry)
+
+    def find_blocks(
+        self,
+        contains: Optional[str] = None,
+        TODO_state: Optional[str] = None,
+    ) -> List[Tuple[str, LogseqSharedBlockView]]:
+        """(page name, block) of every block matching all the given filters.
+        The TODO state is checked first, without decoding the contents."""
+        wanted_state = TODO_STATES.index(TODO_state) + 1 if TODO_state else None
+        needle = contains.encode() if contains is not None else None
+        found = []
+        for name, _, first, n_blocks, _ in self._pages.values():
+            for i in range(first, first + n_blocks):
+                if wanted_state is not None and self._states[i] != wanted_state:
+                    continue
+                if needle is not None:
+                    start = self._text_offsets[2 * i]
+                    end = self._text_offsets[2 * i + 1]
+                    if bytes(self._text_region[start:end]).find(needle) == -1:
+                        continue
+                found.append((name, LogseqSharedBlockView(self, i)))
+        return found
+
+    def close(self) -> None:
+        "release the views then detach from the shared memory"
+        for view in [
+                self._text_offsets, self._prop_offsets, self._levels,
+                self._states, self._text_region, self._prop_region]:
+            view.release()
+        self._shm.close()
+
+    def unlink(self) -> None:
+        "destroy the shared memory, to call once in the creating process"
+        self._shm.unlink()
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __enter__(self) -> "LogseqSharedGraph":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,94 @@
+import textwrap
+from types import MappingProxyType
+from typing import NamedTuple, Optional, Tuple
+
+
+def _shift_indentation(content: str, offset: int) -> str:
+    """add (or remove if negative) offset spaces of indentation to each line.
+    Added indentation uses tabs, removed indentation counts tabs as 4 spaces.
+    Lines containing only whitespace are left untouched."""
+    lines = content.split("\n")
+    if offset > 0:
+        prefix = "\t" * (offset // 4) + " " * (offset % 4)
+        return "\n".join(prefix + li if li.strip() else li for li in lines)
+    for i, li in enumerate(lines):
+        col = 0
+        ic = 0
+        while ic < len(li) and col < -offset and li[ic] in " \t":
+            col += 4 if li[ic] == "\t" else 1
+            ic += 1
+        # a tab can remove more than needed, give back the extra as spaces
+        lines[i] = " " * max(0, col + offset) + li[ic:]
+    return "\n".join(lines)
+
+
+def _render_page(page_properties: dict, blocks: list, verbose: bool = False, check: bool = False) -> str:
+    """the text of a page as returned by LogseqPage.content, from its page
+    properties and the (content, indentation_level) of each of its blocks.
+    Blocks whose indentation is not a multiple of 4 are rounded up, only in
+    the returned text."""
+    lines = [f"{k}:: {v}" for k, v in page_properties.items()]
+    min_level = min((bil for _, bil in blocks), default=0)
+    for cont, bil in blocks:
+        if not bil % 4 == 0:
+            newbil = (1 + bil // 4) * 4
+            if verbose:
+                print(
+                    "block has an indentation level not "
+                    f"divisible by 4: '{bil % 4}' in block {cont}. "
+                    f"setting indentation to {newbil}")
+            cont = _shift_indentation(cont, newbil - bil)
+        if check:
+            assert cont.lstrip().startswith("-")
+        lines.append(cont)
+    temp = "\n".join(lines)
+    if min_level and not page_properties:
+        # only needed if all the blocks are indented
+        temp = textwrap.dedent(temp)
+    return temp.strip()
+
+
+class LogseqBlockSnapshot(NamedTuple):
+    """Immutable copy of the values of a LogseqBlock at a given time.
+    Returned by LogseqBlock.snapshot, it can be shared between threads."""
+    content: str
+    indentation_level: int
+    TODO_state: Optional[str]
+    marker: tuple  # a LogseqMarker
+    properties: MappingProxyType
+    UUID: str
+
+    def dict(self) -> dict:
+        "same as LogseqBlock.dict"
+        return {
+            "block_properties": dict(self.properties),
+            "block_content": self.content,
+            "block_indentation_level": self.indentation_level,
+            "block_TODO_state": self.TODO_state,
+            "block_UUID": self.UUID,
+        }
+
+
+class LogseqPageSnapshot(NamedTuple):
+    """Immutable copy of a LogseqPage at a given time.
+    Returned by LogseqPage.snapshot, it can be read from many threads
+    without locks while the page itself keeps being edited.
+    The snapshots of the blocks that did not change are shared between
+    successive snapshots of a page."""
+    page_properties: MappingProxyType
+    blocks: Tuple[LogseqBlockSnapshot, ...]
+
+    @property
+    def content(self) -> str:
+        "same as LogseqPage.content"
+        return _render_page(
+            self.page_properties,
+            [(b.content, b.indentation_level) for b in self.blocks])
+
+    def dict(self) -> dict:
+        "same as LogseqPage.dict"
+        return {
+            "page_properties": dict(self.page_properties),
+            "page_content": self.content,
+            "blocks": [b.dict() for b in self.blocks],
+        }
@@ -0,0 +1,278 @@
+import json
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+from typing import Union, Callable, Iterator, List, Tuple
+from pathlib import Path, PosixPath
+
+# only use beartype if its installed
+try:
+    from beartype import beartype as typechecker
+except Exception:
+    def typechecker(func: Callable) -> Callable:
+        return func
+
+from .pages import LogseqPage
+from .names import decode_page_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    properties TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_name ON pages (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY,
+    page_id INTEGER NOT NULL REFERENCES pages (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    parent_id INTEGER,
+    content TEXT NOT NULL,
+    indentation_level INTEGER NOT NULL,
+    TODO_state TEXT,
+    UUID TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_page ON blocks (page_id, position);
+CREATE INDEX IF NOT EXISTS blocks_todo ON blocks (TODO_state);
+CREATE INDEX IF NOT EXISTS blocks_uuid ON blocks (UUID);
+CREATE TABLE IF NOT EXISTS block_properties (
+    block_id INTEGER NOT NULL REFERENCES blocks (id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS block_properties_key ON block_properties (key, value);
+CREATE INDEX IF NOT EXISTS block_properties_block ON block_properties (block_id);
+"""
+
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS blocks_fts USING fts5(content)"
+
+
+@typechecker
+class LogseqSQLiteStore:
+    """Copy of a Logseq graph in a SQLite database, to query and search it
+    from any tool without parsing the markdown files, which stay the
+    source of truth.
+
+    Tables:
+        - pages: id, path, name, mtime_ns, size, hash, properties (json)
+        - blocks: id, page_id, position, parent_id, content,
+          indentation_level, TODO_state, UUID
+        - block_properties: block_id, key, value
+        - blocks_fts: FTS5 index of the block contents, its rowid is the
+          id of the block. Absent if SQLite was built without FTS5.
+
+    sync only reparses the files whose mtime or size changed, and only
+    rewrites their rows if their content hash changed too.
+
+    Methods:
+        - sync
+        - search
+        - query
+        - close
+    """
+
+    def __init__(
+        self,
+        db_path: Union[str, PosixPath],
+        graph_dir: Union[str, PosixPath],
+        subdirs: Tuple[str, ...] = ("pages", "journals"),
+        sync: bool = True,
+        verbose: bool = False,
+    ) -> None:
+        """
+        db_path: path to the SQLite database, created if missing. Can be
+            ':memory:'.
+
+        graph_dir: path to the graph
+
+        subdirs: the folders of the graph that contain pages
+
+        sync: bool, default True
+            if True, sync is called at the end of the initialization
+
+        verbose: bool, default False
+        """
+        self.graph_dir = Path(graph_dir)
+        assert self.graph_dir.exists(), f"Dir not found: {graph_dir}"
+        self.subdirs = subdirs
+        self.verbose = verbose
+        # transactions are opened explicitly, see _transaction
+        self.conn = sqlite3.connect(str(db_path), isolation_level=None)
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.execute(FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            self.has_fts = False
+        if sync:
+            self.sync()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        "a single transaction, in which each page is written in a savepoint"
+        self.conn.execute("BEGIN")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def _files(self) -> List[Path]:
+        files = []
+        for subdir in self.subdirs:
+            folder = self.graph_dir / subdir
+            if folder.exists():
+                files.extend(f for f in sorted(folder.iterdir()) if f.suffix == ".md")
+        return files
+
+    def _delete_page(self, page_id: int) -> None:
+        if self.has_fts:
+            self.conn.execute(
+                "DELETE FROM blocks_fts WHERE rowid IN "
+                "(SELECT id FROM blocks WHERE page_id = ?)", (page_id,))
+        self.conn.execute("DELETE FROM pages WHERE id = ?", (page_id,))
+
+    def _page_rows(self, path: Path, content: str) -> Tuple[str, str, list]:
+        """parse a page into its name, its properties as json and the rows
+        of its blocks, without touching the database"""
+        page = LogseqPage(content=content, verbose=False)
+        name = page.page_properties.get("title") or decode_page_name(path.stem)
+        _, children = page._tree()
+        parents = [None] * len(page.blocks)
+        rows = []
+        for position, block in enumerate(page.blocks):
+            for child in children[position]:
+                parents[child] = position
+            rows.append((
+                parents[position], block.content, block.indentation_level,
+                block.TODO_state, block.UUID, list(block.properties.items()),
+            ))
+        return name, json.dumps(page.page_properties, ensure_ascii=False), rows
+
+    def _insert_page(self, rel: str, st, digest: str, name: str, properties: str, rows: list) -> None:
+        page_id = self.conn.execute(
+            "INSERT INTO pages (path, name, mtime_ns, size, hash, properties) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (rel, name, st.st_mtime_ns, st.st_size, digest, properties),
+        ).lastrowid
+        ids = []
+        for position, (parent, content, level, state, uuid, props) in enumerate(rows):
+            block_id = self.conn.execute(
+                "INSERT INTO blocks (page_id, position, parent_id, content, "
+                "indentation_level, TODO_state, UUID) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (page_id, position, ids[parent] if parent is not None else None,
+                 content, level, state, uuid),
+            ).lastrowid
+            ids.append(block_id)
+            self.conn.executemany(
+                "INSERT INTO block_properties (block_id, key, value) VALUES (?, ?, ?)",
+                [(block_id, k, v) for k, v in props],
+            )
+            if self.has_fts:
+                self.conn.execute(
+                    "INSERT INTO blocks_fts (rowid, content) VALUES (?, ?)",
+                    (block_id, content))
+
+    def sync(self) -> dict:
+        """update the database from the files of the graph in a single
+        transaction. Returns the number of pages added, updated, removed,
+        touched (mtime changed but not the content), unchanged and failed
+        (could not be parsed, they are tried again on the next sync)."""
+        stats = {"added": 0, "updated": 0, "removed": 0, "touched": 0, "unchanged": 0, "failed": 0}
+        known = {
+            rel: (page_id, mtime_ns, size, digest)
+            for page_id, rel, mtime_ns, size, digest in self.conn.execute(
+                "SELECT id, path, mtime_ns, size, hash FROM pages")
+        }
+        with self._transaction():
+            seen = set()
+            for path in self._files():
+                rel = str(path.relative_to(self.graph_dir))
+                seen.add(rel)
+                try:
+                    st = path.stat()
+                    old = known.get(rel)
+                    if old is not None and old[1:3] == (st.st_mtime_ns, st.st_size):
+                        stats["unchanged"] += 1
+                        continue
+                    data = path.read_bytes()
+                except FileNotFoundError:
+                    continue
+                digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+                if old is not None and old[3] == digest:
+                    self.conn.execute(
+                        "UPDATE pages SET mtime_ns = ?, size = ? WHERE id = ?",
+                        (st.st_mtime_ns, st.st_size, old[0]))
+                    stats["touched"] += 1
+                    continue
+                try:
+                    name, properties, rows = self._page_rows(path, data.decode())
+                except Exception as err:
+                    # the previous rows, if any, are kept with their old
+                    # mtime so the file is parsed again on the next sync
+                    print(f"Failed to parse {path}: '{err}'")
+                    stats["failed"] += 1
+                    continue
+                self.conn.execute("SAVEPOINT page")
+                try:
+                    if old is not None:
+                        self._delete_page(old[0])
+                    self._insert_page(rel, st, digest, name, properties, rows)
+                except Exception as err:
+                    self.conn.execute("ROLLBACK TO page")
+                    self.conn.execute("RELEASE page")
+                    print(f"Failed to store {path}: '{err}'")
+                    stats["failed"] += 1
+                    continue
+                self.conn.execute("RELEASE page")
+                stats["updated" if old is not None else "added"] += 1
+
+            for rel, (page_id, _, _, _) in known.items():
+                if rel not in seen:
+                    self._delete_page(page_id)
+                    stats["removed"] += 1
+        if self.verbose:
+            print(f"Synced {self.graph_dir}: {stats}")
+        return stats
+
+    def search(self, text: str, limit: int = 50) -> List[dict]:
+        """full text search of the block contents, best matches first.
+        text uses the FTS5 query syntax (e.g. 'python AND "type hints"',
+        'pars*'). Without FTS5, blocks containing text are returned."""
+        if self.has_fts:
+            rows = self.conn.execute(
+                "SELECT pages.name, blocks.id, blocks.content, blocks.TODO_state, blocks.UUID "
+                "FROM blocks_fts JOIN blocks ON blocks.id = blocks_fts.rowid "
+                "JOIN pages ON pages.id = blocks.page_id "
+                "WHERE blocks_fts MATCH ? ORDER BY bm25(blocks_fts) LIMIT ?",
+                (text, limit))
+        else:
+            rows = self.conn.execute(
+                "SELECT pages.name, blocks.id, blocks.content, blocks.TODO_state, blocks.UUID "
+                "FROM blocks JOIN pages ON pages.id = blocks.page_id "
+                "WHERE instr(blocks.content, ?) > 0 LIMIT ?",
+                (text, limit))
+        return [
+            {"page": page, "block_id": block_id, "block_content": content,
+             "block_TODO_state": state, "block_UUID": uuid}
+            for page, block_id, content, state, uuid in rows
+        ]
+
+    def query(self, sql: str, parameters: Union[tuple, dict] = ()) -> List[tuple]:
+        "run any SQL query on the database and return all the rows"
+        return self.conn.execute(sql, parameters).fetchall()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "LogseqSQLiteStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
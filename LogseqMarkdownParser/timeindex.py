@@ -0,0 +1,119 @@
+import datetime
+from bisect import bisect_left, bisect_right
+from typing import Callable, Optional, Tuple, List
+
+# only use beartype if its installed
+try:
+    from beartype import beartype as typechecker
+except Exception:
+    def typechecker(func: Callable) -> Callable:
+        return func
+
+from .pages import LogseqPage
+
+
+@typechecker
+class LogseqTimeIndex:
+    """Index of the logbook clocks and SCHEDULED/DEADLINE dates of several
+    pages, sorted by time so that range queries don't have to go over the
+    content of every block.
+
+    Pages are added with update_page and only the pages that changed since
+    the last query are rescanned, the sorted arrays are then rebuilt.
+
+    Methods:
+        - update_page
+        - remove_page
+        - clocked_time
+        - clocks_between
+        - due_between
+    """
+
+    def __init__(self) -> None:
+        self._by_page = {}  # page name -> (clocks, dates)
+        self._dirty = True
+        self._clocks = []  # sorted (start, end, page name, block)
+        self._clock_starts = []
+        self._max_duration = datetime.timedelta(0)
+        self._dates = []  # sorted (date, kind, page name, block)
+        self._date_keys = []
+
+    def update_page(self, name: str, page: LogseqPage) -> None:
+        "(re)index the clocks and dates of a page"
+        clocks = []
+        dates = []
+        for block in page.blocks:
+            for clock in block.logbook:
+                if clock.end is not None:
+                    clocks.append((clock.start, clock.end, name, block))
+            marker = block.marker
+            if marker.scheduled is not None:
+                dates.append((marker.scheduled, "scheduled", name, block))
+            if marker.deadline is not None:
+                dates.append((marker.deadline, "deadline", name, block))
+        self._by_page[name] = (clocks, dates)
+        self._dirty = True
+
+    def remove_page(self, name: str) -> None:
+        if self._by_page.pop(name, None) is not None:
+            self._dirty = True
+
+    def _rebuild(self) -> None:
+        if not self._dirty:
+            return
+        self._clocks = sorted(
+            (c for clocks, _ in self._by_page.values() for c in clocks),
+            key=lambda c: c[0],
+        )
+        self._clock_starts = [c[0] for c in self._clocks]
+        self._max_duration = max(
+            (c[1] - c[0] for c in self._clocks),
+            default=datetime.timedelta(0),
+        )
+        self._dates = sorted(
+            (d for _, dates in self._by_page.values() for d in dates),
+            key=lambda d: d[0],
+        )
+        self._date_keys = [d[0] for d in self._dates]
+        self._dirty = False
+
+    def clocks_between(
+        self,
+        start: datetime.datetime,
+        end: datetime.datetime,
+    ) -> List[Tuple]:
+        """returns the (start, end, page name, block) of every finished
+        clock that overlaps the range"""
+        self._rebuild()
+        # a clock overlapping the range can't start before start - max_duration
+        lo = bisect_left(self._clock_starts, start - self._max_duration)
+        hi = bisect_left(self._clock_starts, end)
+        return [c for c in self._clocks[lo:hi] if c[1] > start]
+
+    def clocked_time(
+        self,
+        start: datetime.datetime,
+        end: datetime.datetime,
+    ) -> dict:
+        """returns a dict of page name to the total clocked time within
+        the range. Clocks partially in the range are clipped"""
+        totals = {}
+        for c_start, c_end, name, _ in self.clocks_between(start, end):
+            overlap = min(c_end, end) - max(c_start, start)
+            totals[name] = totals.get(name, datetime.timedelta(0)) + overlap
+        return totals
+
+    def due_between(
+        self,
+        start: datetime.date,
+        end: datetime.date,
+        kind: Optional[str] = None,
+    ) -> List[Tuple]:
+        """returns the (date, kind, page name, block) of every SCHEDULED and
+        DEADLINE date between start and end, both included, sorted by date.
+        kind can be 'scheduled' or 'deadline' to only get one of them."""
+        assert kind in [None, "scheduled", "deadline"], f"Invalid kind: {kind}"
+        self._rebuild()
+        lo = bisect_left(self._date_keys, start)
+        hi = bisect_right(self._date_keys, end)
+        return [d for d in self._dates[lo:hi] if kind is None or d[1] == kind]
@@ -0,0 +1,249 @@
+"""
+Compare HighlightAnchorer with match_highlight_to_corpus, the function
+previously used by examples/omnivore_to_anki.py (copied below, minus its
+joblib.Memory cache). Highlights are taken from a random article, then
+altered like PDF parsing does (doubled spaces, changed case, cut ends).
+
+Usage: `python bench_anchoring.py --n_words 20000 --n_highlights 10`
+"""
+import sys
+import time
+import random
+from math import inf
+from typing import List
+import fire
+from joblib import Parallel, delayed
+from rapidfuzz.distance import Levenshtein
+from rapidfuzz.distance.Levenshtein import normalized_distance as lev_dist
+from rapidfuzz.fuzz import ratio as lev_ratio
+
+saved_path = sys.path
+sys.path.insert(0, "..")
+import LogseqMarkdownParser
+sys.path = saved_path
+
+
+class lev:
+    "the python-Levenshtein functions used by match_highlight_to_corpus"
+    @staticmethod
+    def ratio(s1: str, s2: str) -> float:
+        return Levenshtein.normalized_similarity(s1, s2)
+
+    @staticmethod
+    def distance(s1: str, s2: str) -> int:
+        return Levenshtein.distance(s1, s2)
+
+
+def match_highlight_to_corpus(
+        query: str,
+        corpus: str,
+        case_sensitive: bool = True,
+        step_factor: int = 500,
+        n_jobs: int = -1,
+    ) -> List:
+    '''
+    Source: https://stackoverflow.com/questions/36013295/find-best-substring-match
+    Returns the substring of the corpus with the least Levenshtein distance from the query
+    (May not always return optimal answer).
+
+    Arguments
+    - query: str
+    - corpus: str
+    - case_sensitive: bool
+    - step_factor: int
+        Only used in the long way.
+        Influences the resolution of the thorough search once the general region is found.
+        The increment in ngrams lengths used for the thorough search is calculated as len(query)//step_factor.
+        Increasing this increases the number of ngram lengths used in the thorough search and increases the chances 
+        of getting the optimal solution at the cost of runtime and memory.
+    - n_jobs: int
+        number of jobs to use for multithreading. 1 to disable
+
+    Returns
+    [
+        List of best matching substrings of corpus,
+        Levenshtein ratio of closest match,
+        Levenshtein distance of closest match,
+        True if used the quick way False if using the long way,
+        ]
+    '''
+
+    # quick way
+    lq = len(query)
+    lc = len(corpus)
+    lquery = query.casefold()
+    lcorp = corpus.casefold()
+    # 1. find most probably region that contains the appropriate words
+    qwords = [w.strip() for w in set(lquery.casefold().split(" ")) if len(w.strip()) > 3]
+    indexes = []
+    for w in qwords:
+        m = []
+        prev = 0
+        while w in lcorp[prev:] and len(m) < 20:
+            m.append(prev + lcorp[prev:].index(w))
+            prev = m[-1] + 1
+        if len(m) > 20:
+            continue
+        if m:
+            indexes.append(m)
+    if indexes:
+        mins = [min(ind) for ind in indexes]
+        maxs = [max(ind) for ind in indexes]
+        mean_min = max(0, int(sum(mins) / len(mins)) - int(lq * 1.2))
+        mean_max = min(lc, int(sum(maxs) / len(maxs)) + int(lq * 1.2))
+        
+        mini_corp = corpus[mean_min:mean_max+1]
+
+        # 2. in the region, check the lev ratio in a sliding window
+        # to  determine best sub region
+        batches = [mini_corp[i*lq:(i+1)*lq] for i in range(0, len(mini_corp) // lq + 1)]
+        batches = [b for b in batches if b.strip()]
+        ratios = Parallel(
+            backend="threading",
+            n_jobs=n_jobs,
+        )(delayed(lev.ratio)(query, b) for b in batches)
+        max_rat = max(ratios)
+        max_rat_idx = [i for i,r in enumerate(ratios) if r == max_rat]
+
+        # 3. in the best sub region, find the best substring with a 1
+        # character sliding window using both ratio and distance
+        best_ratio = -inf
+        best_dist = inf
+        best_matches = []
+        def get_rat_dist(s1, s2):
+            return [lev.ratio(s1, s2), lev.distance(s1, s2)]
+        for idx in max_rat_idx:
+            iidx = mini_corp.index("".join(batches[idx-1:idx+1]))
+            area = mini_corp[iidx:iidx+3 * lq]
+            if not area.strip():
+                continue
+            batches2 = [area[i:lq+i] for i in range(0, len(area) + 1)]
+            ratdist2 = Parallel(
+                backend="threading",
+                n_jobs=n_jobs,
+            )(delayed(get_rat_dist)(query, b) for b in batches2)
+            ratios2 = [it[0] for it in ratdist2]
+            distances2 = [it[1] for it in ratdist2]
+            mr = max(ratios2)
+            md = min(distances2)
+            if mr >= best_ratio and md <= best_dist:
+                if mr == best_ratio and md == best_dist:
+                    best_matches.append(batches2[ratios2.index(best_ratio)])
+                else:
+                    best_ratio = mr
+                    best_dist = md
+                    best_matches = [batches2[ratios2.index(best_ratio)]]
+
+        if best_matches:
+            best_matches = list(set(best_matches))
+            return [best_matches, best_ratio, best_dist, True]
+
+
+    if not case_sensitive:
+        query = query.casefold()
+        corpus = corpus.casefold()
+
+    corpus_len = len(corpus)
+    query_len = len(query)
+    query_len_by_2 = max(query_len // 2, 1)
+    query_len_by_step_factor = max(query_len // step_factor, 1)
+
+    closest_match_idx = 0
+    min_dist = inf
+    # Intial search of corpus checks ngrams of the same length as the query
+    # Step is half the length of the query.
+    # This is found to be good enough to find the general region of the best match in the corpus
+    corpus_ngrams = [corpus[i:i+query_len] for i in range(0, corpus_len-query_len+1, query_len_by_2)]
+    dists = Parallel(
+        backend="threading",
+        n_jobs=n_jobs,
+    )(delayed(lev_dist)(ngram, query) for ngram in corpus_ngrams)
+    for idx, ngram in enumerate(corpus_ngrams):
+        ngram_dist = dists[idx]
+        if ngram_dist < min_dist:
+            min_dist = ngram_dist
+            closest_match_idx = idx
+
+    closest_match_idx = closest_match_idx * query_len_by_2
+    closest_match = corpus[closest_match_idx: closest_match_idx + query_len]
+    left = max(closest_match_idx - query_len_by_2 - 1, 0)
+    right = min((closest_match_idx+query_len-1) + query_len_by_2 + 2, corpus_len)
+    narrowed_corpus = corpus[left: right]
+    narrowed_corpus_len = len(narrowed_corpus)
+
+    # Once we have the general region of the best match we do a more thorough search in the region
+    # This is done by considering ngrams of various lengths in the region using a step of 1
+    ngram_lens = [l for l in range(narrowed_corpus_len, query_len_by_2 - 1, -query_len_by_step_factor)]
+    # Construct sets of ngrams where each set has ngrams of a particular length made over the region with a step of 1
+    narrowed_corpus_ngrams = [
+        [narrowed_corpus[i:i+ngram_len] for i in range(0, narrowed_corpus_len-ngram_len+1)]
+        for ngram_len in ngram_lens
+    ]
+
+    # Thorough search of the region in which the best match exists
+    def ld_set(ngram_set, query):
+        dists = []
+        for ngram in ngram_set:
+            dists.append(lev_dist(ngram, query))
+        return dists
+    dist_list = Parallel(
+        backend="threading",
+        n_jobs=n_jobs,
+    )(delayed(ld_set)(ngram_set, query) for ngram_set in narrowed_corpus_ngrams)
+
+    best_matches = []
+    for ing, ngram_set in enumerate(narrowed_corpus_ngrams):
+        for iing, ngram in enumerate(ngram_set):
+            ngram_dist = dist_list[ing][iing]
+            if ngram_dist == min_dist:
+                best_matches.append(ngram)
+            elif ngram_dist < min_dist:
+                min_dist = ngram_dist
+                best_matches = [ngram]
+
+    best_matches = list(set(best_matches))
+    assert len(best_matches) >= 1
+    best_ratio = max([lev_ratio(query, bm) for bm in best_matches])
+    return best_matches, best_ratio, min_dist, False
+
+
+def make_article(n_words: int) -> str:
+    vocabulary = [
+        "".join(random.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(random.randint(2, 10)))
+        for _ in range(5000)
+    ]
+    return " ".join(random.choice(vocabulary) for _ in range(n_words))
+
+
+def alter(text: str) -> str:
+    text = text.replace(" ", "  ", 3)
+    return text[2:-3].upper()
+
+
+def main(n_words: int = 20000, n_highlights: int = 10, length: int = 300, seed: int = 0) -> None:
+    random.seed(seed)
+    article = make_article(n_words)
+    starts = sorted(random.randrange(0, len(article) - length) for _ in range(n_highlights))
+    highlights = [alter(article[s:s + length]) for s in starts]
+
+    t = time.perf_counter()
+    reference = [
+        match_highlight_to_corpus(query=h, corpus=article, case_sensitive=False, n_jobs=4)[0][0]
+        for h in highlights
+    ]
+    t_reference = time.perf_counter() - t
+
+    t = time.perf_counter()
+    anchorer = LogseqMarkdownParser.HighlightAnchorer(article)
+    t_index = time.perf_counter() - t
+    anchors = anchorer.anchor_many(highlights)
+    t_anchor = time.perf_counter() - t
+
+    n_reference = sum(abs(article.find(m) - s) <= 5 for m, s in zip(reference, starts))
+    n_found = sum(abs(a.start - s) <= 5 for a, s in zip(anchors, starts))
+    print(f"match_highlight_to_corpus: {t_reference:.2f}s ({n_reference}/{n_highlights} found within 5 characters)")
+    print(f"HighlightAnchorer: {t_anchor:.2f}s including {t_index:.3f}s of indexing ({n_found}/{n_highlights} found within 5 characters)")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
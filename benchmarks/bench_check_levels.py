@@ -0,0 +1,50 @@
+"""
+Measure the cost of each check level when parsing a page and setting
+block properties.
+
+Usage: `python bench_check_levels.py --n_blocks 2000`
+"""
+import time
+import fire
+
+import sys
+saved_path = sys.path
+sys.path.insert(0, "..")
+import LogseqMarkdownParser
+sys.path = saved_path
+
+
+def make_page(n_blocks: int, n_props: int) -> str:
+    lines = ["title:: benchmark"]
+    for i in range(n_blocks):
+        indent = "\t" * (i % 3)
+        lines.append(f"{indent}- TODO block {i}")
+        for p in range(n_props):
+            lines.append(f"{indent}  prop-{p}:: value {p}")
+    return "\n".join(lines)
+
+
+def main(n_blocks: int = 2000, n_props: int = 3, repeat: int = 3) -> None:
+    text = make_page(n_blocks, n_props)
+    print(f"{n_blocks} blocks with {n_props} properties each, best of {repeat}:")
+    for level in LogseqMarkdownParser.CHECK_LEVELS:
+        best_parse = best_edit = float("inf")
+        for _ in range(repeat):
+            t = time.perf_counter()
+            page = LogseqMarkdownParser.LogseqPage(text, check_level=level)
+            for block in page.blocks:
+                block.UUID
+            best_parse = min(best_parse, time.perf_counter() - t)
+
+            t = time.perf_counter()
+            for block in page.blocks:
+                block.set_property("prop-0", "new value")
+                block.set_property("new-prop", "other value")
+            best_edit = min(best_edit, time.perf_counter() - t)
+        print(
+            f"  {level:>8}: parse {best_parse * 1000:8.1f} ms | "
+            f"set_property {best_edit / (2 * n_blocks) * 1e6:7.1f} us/call")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
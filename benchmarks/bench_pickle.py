@@ -0,0 +1,68 @@
+"""
+Compare the size and round trip time of LogseqPage.to_bytes / pickle
+(which uses to_bytes) against the default pickling of the page attributes
+and of every LogseqBlock, as used before LogseqPage had its own encoding.
+
+Usage: `python bench_pickle.py --n_blocks 5000 --n_iter 20`
+"""
+import sys
+import time
+import pickle
+import fire
+
+saved_path = sys.path
+sys.path.insert(0, "..")
+import LogseqMarkdownParser
+sys.path = saved_path
+
+
+def make_page(n_blocks: int) -> LogseqMarkdownParser.LogseqPage:
+    lines = []
+    for i in range(n_blocks):
+        state = "TODO " if i % 3 == 0 else ""
+        lines.append(f"{chr(9) * (i % 3)}- {state}block {i} with some text")
+        lines.append(f"{chr(9) * (i % 3)}  prop:: {i}")
+    return LogseqMarkdownParser.LogseqPage("\n".join(lines))
+
+
+def timeit(func, n_iter: int) -> float:
+    start = time.perf_counter()
+    for _ in range(n_iter):
+        func()
+    return (time.perf_counter() - start) / n_iter
+
+
+def main(n_blocks: int = 5000, n_iter: int = 20) -> None:
+    page = make_page(n_blocks)
+    # the default pickling of the instance, bypassing LogseqPage.__reduce_ex__
+    default_state = page.__dict__
+
+    results = {
+        "default pickle": (
+            lambda: pickle.dumps(default_state, protocol=5),
+            pickle.loads,
+        ),
+        "pickle (to_bytes)": (
+            lambda: pickle.dumps(page, protocol=5),
+            pickle.loads,
+        ),
+        "to_bytes/from_bytes": (
+            page.to_bytes,
+            LogseqMarkdownParser.LogseqPage.from_bytes,
+        ),
+    }
+    for name, (dump, load) in results.items():
+        data = dump()
+        t_dump = timeit(dump, n_iter)
+        t_load = timeit(lambda: load(data), n_iter)
+        print(
+            f"{name:>20}: {len(data) / 1e6:.2f} MB, "
+            f"dump {t_dump * 1000:.1f} ms, load {t_load * 1000:.1f} ms, "
+            f"round trip {(t_dump + t_load) * 1000:.1f} ms")
+
+    loaded = LogseqMarkdownParser.LogseqPage.from_bytes(page.to_bytes())
+    assert loaded.content == page.content
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
@@ -0,0 +1,79 @@
+"""
+Compare the private memory used by worker processes that each parse their
+own copy of a graph against workers attached to a LogseqSharedGraph.
+The private memory is read from /proc/self/smaps_rollup so this only
+runs on Linux.
+
+Usage: `python bench_shared_graph.py --n_pages 200 --n_blocks 500 --n_workers 4`
+"""
+import sys
+import tempfile
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import fire
+
+saved_path = sys.path
+sys.path.insert(0, "..")
+import LogseqMarkdownParser
+sys.path = saved_path
+
+
+def private_mb() -> float:
+    total = 0
+    for line in Path("/proc/self/smaps_rollup").read_text().splitlines():
+        if line.startswith(("Private_Clean", "Private_Dirty")):
+            total += int(line.split()[1])
+    return total / 1024
+
+
+def make_graph(folder: Path, n_pages: int, n_blocks: int) -> None:
+    (folder / "pages").mkdir()
+    for p in range(n_pages):
+        lines = []
+        for i in range(n_blocks):
+            state = "TODO " if i % 3 == 0 else ""
+            lines.append(f"{chr(9) * (i % 3)}- {state}block {i} of page {p} with some text")
+            lines.append(f"{chr(9) * (i % 3)}  prop:: {i}")
+        (folder / "pages" / f"page{p}.md").write_text("\n".join(lines))
+
+
+def own_copy_worker(graph_dir: str) -> tuple:
+    before = private_mb()
+    graph = LogseqMarkdownParser.LogseqGraph(graph_dir)
+    n = sum(
+        1 for page in graph.pages.values()
+        for b in page.blocks if b.TODO_state == "TODO")
+    return n, private_mb() - before
+
+
+def shared_worker(name: str) -> tuple:
+    before = private_mb()
+    graph = LogseqMarkdownParser.LogseqSharedGraph.attach(name)
+    n = len(graph.find_blocks(TODO_state="TODO"))
+    used = private_mb() - before
+    graph.close()
+    return n, used
+
+
+def main(n_pages: int = 200, n_blocks: int = 500, n_workers: int = 4) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        make_graph(Path(tmp), n_pages, n_blocks)
+        shared = LogseqMarkdownParser.LogseqSharedGraph.create(tmp)
+        try:
+            for name, worker, arg in [
+                    ("own copy", own_copy_worker, tmp),
+                    ("shared memory", shared_worker, shared.name)]:
+                with ProcessPoolExecutor(n_workers) as pool:
+                    results = list(pool.map(worker, [arg] * n_workers))
+                assert len(set(n for n, _ in results)) == 1
+                total = sum(mb for _, mb in results)
+                print(
+                    f"{name:>14}: {total:.1f} MB private memory added by "
+                    f"{n_workers} workers ({total / n_workers:.1f} MB each)")
+        finally:
+            shared.close()
+            shared.unlink()
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
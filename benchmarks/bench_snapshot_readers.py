@@ -0,0 +1,80 @@
+"""
+Measure the throughput of reader threads querying page snapshots while a
+writer thread keeps editing the page and publishing new snapshots.
+
+Run it with both the regular and the free-threaded CPython builds
+(e.g. `python3.13t bench_snapshot_readers.py`) to compare the scaling: with
+the GIL the total throughput stays roughly flat as threads are added,
+without it it should grow with the number of cores.
+
+Usage: `python bench_snapshot_readers.py --n_blocks 2000 --duration 2`
+"""
+import sys
+import time
+import threading
+import fire
+
+saved_path = sys.path
+sys.path.insert(0, "..")
+import LogseqMarkdownParser
+sys.path = saved_path
+
+
+def make_page(n_blocks: int) -> LogseqMarkdownParser.LogseqPage:
+    lines = []
+    for i in range(n_blocks):
+        state = "TODO " if i % 3 == 0 else ""
+        lines.append(f"{chr(9) * (i % 3)}- {state}block {i}")
+        lines.append(f"{chr(9) * (i % 3)}  prop:: {i}")
+    return LogseqMarkdownParser.LogseqPage("\n".join(lines))
+
+
+def run(page, n_readers: int, duration: float) -> tuple:
+    published = {"snapshot": page.snapshot()}
+    stop = threading.Event()
+    counts = [0] * n_readers
+    n_published = [0]
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            block = page.blocks[i % len(page.blocks)]
+            block.set_property("prop", str(i))
+            published["snapshot"] = page.snapshot()  # atomic swap
+            n_published[0] += 1
+            i += 1
+
+    def reader(ir):
+        n = 0
+        while not stop.is_set():
+            snap = published["snapshot"]
+            sum(1 for b in snap.blocks if b.TODO_state == "TODO")
+            n += 1
+        counts[ir] = n
+
+    threads = [threading.Thread(target=writer)]
+    threads += [threading.Thread(target=reader, args=(ir,)) for ir in range(n_readers)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(counts) / duration, n_published[0] / duration
+
+
+def main(n_blocks: int = 2000, duration: float = 2.0, max_threads: int = 8) -> None:
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}")
+    page = make_page(n_blocks)
+    n_readers = 1
+    while n_readers <= max_threads:
+        reads, writes = run(page, n_readers, duration)
+        print(
+            f"  {n_readers} reader(s): {reads:10.1f} queries/s "
+            f"({reads / n_readers:8.1f} per thread), {writes:8.1f} snapshots/s")
+        n_readers *= 2
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
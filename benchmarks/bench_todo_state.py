@@ -0,0 +1,72 @@
+"""
+Compare the cost per block of the TODO state detection against the
+previous approach that ran one uncompiled re.search per keyword over the
+whole block content.
+
+Usage: `python bench_todo_state.py --n_blocks 10000`
+"""
+import re
+import time
+import random
+import fire
+
+import sys
+saved_path = sys.path
+sys.path.insert(0, "..")
+import LogseqMarkdownParser
+sys.path = saved_path
+
+
+def legacy_TODO_state(content: str):
+    "previous implementation of LogseqBlock._get_TODO_state"
+    TODO_state = None
+    for keyword in ["TODO", "DOING", "NOW", "LATER", "DONE"]:
+        if re.search(f"- {keyword} .*", content.lstrip()):
+            assert not TODO_state
+            TODO_state = keyword
+    return TODO_state
+
+
+def make_blocks(n_blocks: int, body_lines: int) -> list:
+    random.seed(42)
+    body = "\n".join(f"  some body line number {i} of the block" for i in range(body_lines))
+    blocks = []
+    for i in range(n_blocks):
+        marker = random.choice(["TODO ", "DONE ", "LATER [#A] ", "", "", ""])
+        cont = f"- {marker}block {i}"
+        if body:
+            cont += "\n" + body
+        blocks.append(LogseqMarkdownParser.LogseqBlock(cont))
+    return blocks
+
+
+def main(n_blocks: int = 10000, body_lines: int = 5, repeat: int = 5) -> None:
+    blocks = make_blocks(n_blocks, body_lines)
+
+    best_legacy = best_new = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for b in blocks:
+            legacy_TODO_state(b.content)
+        best_legacy = min(best_legacy, time.perf_counter() - t)
+
+        t = time.perf_counter()
+        for b in blocks:
+            b._get_marker()  # bypass the cache to measure the parsing itself
+        best_new = min(best_new, time.perf_counter() - t)
+
+    for b in blocks:
+        b.TODO_state  # fill the cache
+    t = time.perf_counter()
+    for b in blocks:
+        b.TODO_state
+    cached = time.perf_counter() - t
+
+    print(f"{n_blocks} blocks with {body_lines} body lines, best of {repeat}:")
+    print(f"  legacy re.search per keyword: {best_legacy / n_blocks * 1e6:.2f} us/block")
+    print(f"  precompiled marker (uncached): {best_new / n_blocks * 1e6:.2f} us/block")
+    print(f"  TODO_state (cached): {cached / n_blocks * 1e6:.2f} us/block")
+
+
+if __name__ == "__main__":
+    fire.Fire(main)
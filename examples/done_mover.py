@@ -1,6 +1,6 @@
 import urllib.request
 import time
-import difflib
+from collections import Counter
 from pathlib import Path
 import fire
 
@@ -21,6 +21,13 @@ def check_internet_connection():
         return False
 
 
+def block_hash(block) -> str:
+    """content_hash of the block once its tabs are turned into 4 spaces:
+    export_to turns 4 spaces into tabs, even inside code blocks"""
+    return LogseqMarkdownParser.LogseqBlock(
+        block.content.replace("\t", " " * 4)).content_hash
+
+
 def main(
         TODO_path,
         DONE_path,
@@ -53,92 +60,68 @@ def main(
     assert Path(TODO_path).exists, "TODO_path does not exist"
 
     todos = LogseqMarkdownParser.parse_file(TODO_path, verbose)
-    orig_todos = Path(TODO_path).read_text().replace("\t", " " * 4)
 
-    if Path(DONE_path).exists():
-        dones = LogseqMarkdownParser.parse_file(DONE_path, verbose).blocks
-        orig_dones = Path(DONE_path).read_text().replace("\t", " " * 4)
-    else:
-        dones = []
-        orig_dones = ""
+    # the DONE page is never parsed: the moved blocks are appended to it
+    dones = []
+
+    # hashes of every block before moving them, they don't depend on the
+    # indentation
+    orig_hashes = Counter(block_hash(b) for b in todos.blocks)
 
     n_moved = 0
     top_level_blocks_moved = []
-    for i, block in enumerate(todos.blocks):
-        if block is None:
-            continue  # already added
-        if block.TODO_state == "DONE":
-            parent_indent = block.indentation_level
-            if parent_indent == 0:
-                top_level_blocks_moved.append(block)
-            dones.append(block)
-            todos.blocks[i] = None
-            n_moved += 1
-            for ii in range(i+1, len(todos.blocks)):
-                child = todos.blocks[ii]
-                if child.indentation_level <= parent_indent:
-                    # not a child, stop adding those blocks
-                    break
-                else:
-                    # is a child, also add those blocks
-                    dones.append(todos.blocks[ii])
-                    todos.blocks[ii] = None
-                    n_moved += 1
-        else:
-            assert "- DONE " not in str(block), f"{block}"
-
-    todos.blocks = [b for b in todos.blocks if b is not None]
-    assert not [b for b in dones if b is None], "dones contained None"
-    dones = LogseqMarkdownParser.LogseqPage(
-            content="\n".join([str(b) for b in dones]),
+    moved = set()
+    for block in [b for b in todos.blocks if b.TODO_state == "DONE"]:
+        if id(block) in moved:
+            continue  # already moved as the child of another DONE block
+        if block.indentation_level == 0:
+            top_level_blocks_moved.append(block)
+        subtree = todos.extract_subtree(block)
+        dones.extend(subtree)
+        moved.update(id(b) for b in subtree)
+        n_moved += len(subtree)
+    for block in todos.blocks:
+        assert "- DONE " not in str(block), f"{block}"
+
+    # reuse the block objects instead of parsing their text again
+    dones = LogseqMarkdownParser.LogseqPage.from_blocks(
+            dones,
             verbose=verbose)
 
-    # export in a temporary file to check the output
+    # export in a temporary file then parse it back to check that each
+    # block removed from the todos ends up in the dones
     temp_file = Path("./cache")
     todos.export_to(temp_file, overwrite=True)
-    temp_todos = temp_file.read_text().replace("\t", " " * 4)
-    dones.export_to(temp_file, overwrite=True)
-    temp_dones = temp_file.read_text().replace("\t", " " * 4)
+    temp_todos = LogseqMarkdownParser.parse_file(temp_file)
+    if dones.blocks:
+        dones.export_to(temp_file, overwrite=True)
+        temp_dones = LogseqMarkdownParser.parse_file(temp_file)
+    else:
+        temp_dones = dones
     temp_file.unlink()
 
-    # manually check that each line that is removed from todo
-    # ends up in the done file
-    diff_todo = [d for d in difflib.ndiff(
-            orig_todos.split("\n"),
-            temp_todos.split("\n"),
-            )]
-    diff_done = [d for d in difflib.ndiff(
-            orig_dones.split("\n"),
-            temp_dones.split("\n"),
-            )]
-
-    assert (diff_todo and diff_done) or (not diff_todo and not diff_done), (
-        "something went wrong")
-
-    missings = []
-    for d in diff_todo:
-        if d.startswith("+"):
-            if "-" + d[1:] not in diff_done:
-                missings.append(d)
-        elif d.startswith("-"):
-            if "+" + d[1:] not in diff_done:
-                missings.append(d)
-    if missings:
-        print("Missing lines:")
-        for m in missings:
-            print(m)
+    new_hashes = Counter(
+        block_hash(b) for b in temp_todos.blocks + temp_dones.blocks)
+    missings = orig_hashes - new_hashes
+    extras = new_hashes - orig_hashes
+    if missings or extras:
+        print("Missing or unexpected blocks:")
+        for b in todos.blocks + dones.blocks + temp_todos.blocks + temp_dones.blocks:
+            if block_hash(b) in missings or block_hash(b) in extras:
+                print(b)
+        raise Exception("Blocks would be lost or changed, no file was modified")
 
     n_todo = len(todos.blocks)
     n_done = len(dones.blocks)
     print(f"Moved {n_moved} blocks.")
     print(f"Number of blocks in TODO: {n_todo}")
-    print(f"Number of blocks in DONE: {n_done}")
+    print(f"Number of blocks appended to DONE: {n_done}")
     if top_level_blocks_moved:
         print(f"{len(top_level_blocks_moved)} top level blocks moved:")
         for tp in top_level_blocks_moved:
             print(tp)
     todos.export_to(TODO_path, overwrite=True)
-    dones.export_to(DONE_path, overwrite=True)
+    LogseqMarkdownParser.append_blocks(DONE_path, dones.blocks)
 
 if __name__ == "__main__":
     fire.Fire(main)
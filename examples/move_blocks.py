@@ -64,46 +64,29 @@ def main(
         for b in parsed_output.blocks
     ) == 1, f"found no or multiple line for pattern '{regex_pattern}'"
 
-    # find index of the pattern line
-    good_location = None
-    level = None
-    skip_sep = True  # don't add separator if no other children blocks (only works if order=='after')
-    for ib, ob in enumerate(parsed_output.blocks):
-        if pattern.match(ob.content):
-            assert good_location is None and level is None
-            good_location = ib
-            level = ob.indentation_level
-            if order == "before":
-                break
-            elif order == "after":
-                continue
-            else:
-                raise ValueError(order)
-        elif good_location and ob.indentation_level <= level:
-            assert order == "after"
-            skip_sep = False
-            good_location = ib - 1
-            break
-    assert good_location is not None and level is not None
+    header = [b for b in parsed_output.blocks if pattern.match(b.content)][0]
+    has_children = len(parsed_output.subtree(header)) > 1
 
-    if order == "before" and sep.strip():
-        # add separator block before adding the new blocks
-        sep_block = LogseqMarkdownParser.LogseqBlock(content=sep, verbose=verbose_parsing)
-        sep_block.indentation_level = level + 4
-        parsed_output.blocks.insert(good_location, sep_block)
-
-    # moving the blocks
-    while parsed_input.blocks:
-        parsed_output.blocks.insert(good_location, parsed_input.blocks.pop(-1))
-
-        # don't forget to indent the new blocks
-        parsed_output.blocks[good_location].indentation_level += level + 4
+    # taking all the blocks of the input
+    new_blocks = parsed_input.blocks
+    parsed_input.blocks = []
 
-    if order == "after" and not skip_sep and sep.strip():
-        # add separator block after adding the new blocks
+    # add a separator between the new blocks and the previous children
+    # (only if there are previous children when order=='after')
+    if sep.strip() and (order == "before" or has_children):
         sep_block = LogseqMarkdownParser.LogseqBlock(content=sep, verbose=verbose_parsing)
-        sep_block.indentation_level = level + 4
-        parsed_output.blocks.insert(good_location, sep_block)
+        sep_block.indentation_level = new_blocks[0].indentation_level
+        if order == "before":
+            new_blocks = new_blocks + [sep_block]
+        else:
+            new_blocks = [sep_block] + new_blocks
+
+    # moving the blocks in one go, they are indented as children of the header
+    parsed_output.insert_subtree(
+        blocks=new_blocks,
+        target=header,
+        position="first_child" if order == "before" else "last_child",
+    )
 
     assert parsed_output.content, "something went wrong"
 
@@ -32,13 +32,11 @@ import fire
 import uuid
 
 import pandas as pd
-from joblib import Parallel, delayed, Memory
+from joblib import Memory
 
 from typing import List
 from math import inf
 
-from rapidfuzz.distance.Levenshtein import normalized_distance as lev_dist
-from rapidfuzz.fuzz import ratio as lev_ratio
 
 # to parse PDF
 from langchain_community.document_loaders import PyPDFLoader
@@ -212,25 +210,37 @@ class omnivore_to_anki:
         self.create_cards_if_no_content = create_cards_if_no_content
         self.start_name = start_name
 
-        # get list of files to check
+        # get list of files to check, without parsing the graph
+        graph = LogseqMarkdownParser.LogseqGraph(graph_dir, subdirs=("pages",), load=False)
         files = [f
-                 for f in (Path(graph_dir) / "pages").iterdir()
-                 if f.name.startswith(start_name)
-                 and f.name.endswith(".md")
-                 and not f.name.endswith("___flashcards.md")
+                 for _, f in graph.name_index.prefix(
+                     LogseqMarkdownParser.decode_page_name(start_name))
+                 if not f.name.endswith("___flashcards.md")
                  ]
 
         assert files, (
                 f"No files found in {graph_dir} with start_name {start_name}")
 
-        files = sorted(
-                files,
-                key=lambda f: parse_date(f),
-                reverse=True if recent_article_fist else False,
+        # sort by date-saved, the dates are cached so only new or modified
+        # articles are read
+        date_index = LogseqMarkdownParser.LogseqDateIndex(
+                graph_dir,
+                date_properties=("date-saved",),
+                date_formats=("%d-%m-%Y",),
+                cache_path=Path(".cache") / "date_index.json",
                 )
+        selected = set(files)
+        files = [
+                f for f in date_index.between(newest_first=recent_article_fist)
+                if f in selected
+                ]
+        undated = sorted(selected - set(files))
+        assert not undated, (
+                "Articles with a missing or invalid date-saved property "
+                "(expected format: %d-%m-%Y):\n" + "\n".join(str(f) for f in undated))
 
         # filter only those that contain TODO
-        files = [f for f in files if "- TODO " in f.read_text()]
+        files = [f for f in files if LogseqMarkdownParser.matches_prefilter(f, "- TODO ")]
         assert files, "No files contained TODO"
 
         self.p(f"Found {len(files)} omnivore articles to create anki cards for")
@@ -253,6 +263,12 @@ class omnivore_to_anki:
         site = None
         article_name = None
         article_candidates = {}
+        anchorers = {}  # article text -> HighlightAnchorer, built once per text
+
+        def get_anchorer(text: str) -> LogseqMarkdownParser.HighlightAnchorer:
+            if text not in anchorers:
+                anchorers[text] = LogseqMarkdownParser.HighlightAnchorer(text)
+            return anchorers[text]
 
         art_prop = {}
 
@@ -370,16 +386,11 @@ class omnivore_to_anki:
                     # high never found in f: compute best matching substring
                     if high not in v:
                         best_candidate = None
-                        min_dist = inf
-                        max_ratio = -inf
+                        max_score = -inf
                         for k, v in article_candidates.items():
-                            _, ratio, dist, method = match_highlight_to_corpus(
-                                    query=high,
-                                    corpus=v,
-                                    n_jobs=4)
-                            if dist < min_dist and ratio > max_ratio:
-                                min_dist = dist
-                                max_ratio = ratio
+                            anchor = get_anchorer(v).anchor(high)
+                            if anchor is not None and anchor.score > max_score:
+                                max_score = anchor.score
                                 best_candidate = k
                         assert best_candidate
                         art_cont = article_candidates[best_candidate]
@@ -408,13 +419,20 @@ class omnivore_to_anki:
                             "characters so it might be too hard to find "
                             "a substring for in the current "
                             "implementation. Open an issue.")
-                    matches, ratio, dist, mathod = match_highlight_to_corpus(
-                        query=high,
-                        corpus=art_cont,
-                        n_jobs=4)
-                    if len(matches) == 1:
+                    anchorer = get_anchorer(art_cont)
+                    best = anchorer.anchor(high)
+                    assert best is not None, (
+                        f"Could not match highlight '{high}' to the article")
+                    ratio = best.score
+                    # other places of the article matching as well
+                    matches = [art_cont[best.start:best.end]]
+                    for a in anchorer.candidates(high):
+                        m = art_cont[a.start:a.end]
+                        if a.score == ratio and m not in matches:
+                            matches.append(m)
+                    if ratio > 95 or (len(matches) == 1 and ratio >= 80):
                         best_substring_match = matches[0]
-                    elif ratio <= 95:
+                    else:
                         mat = ""
                         for i, m in enumerate(matches):
                             mat += f" * {i+1}: '{m}'\n"
@@ -501,8 +519,10 @@ class omnivore_to_anki:
 
         # insert cloze as blocks in a new page
         newpage = LogseqMarkdownParser.LogseqPage(content="", verbose=False)
-        newpage.set_property("omnivore-type", "flashcard_page")
-        newpage.set_property("deck", self.anki_deck_target)
+        newpage.set_properties({
+            "omnivore-type": "flashcard_page",
+            "deck": self.anki_deck_target,
+        })
         done = []
         for buid, row in df.iterrows():
             cloze = row["cloze"]
@@ -516,12 +536,15 @@ class omnivore_to_anki:
             cont = f"- {cloze.strip()}"
             cloze_block = LogseqMarkdownParser.LogseqBlock(cont, verbose=False)
             cloze_block.indentation_level = 0
-            cloze_block.set_property("omnivore-type", "highlightcloze")
-            cloze_block.set_property("omnivore-clozedate", str(datetime.today()))
-            cloze_block.set_property("omnivore-clozeparentuuid", buid)
-            cloze_block.set_property("id", df.loc[buid, "cloze_hash"])
-            cloze_block.set_property("deck", self.anki_deck_target)
-            cloze_block.set_property("parent", f"#{buid}")
+            # the properties are set all at once at the end
+            cloze_props = {
+                "omnivore-type": "highlightcloze",
+                "omnivore-clozedate": str(datetime.today()),
+                "omnivore-clozeparentuuid": buid,
+                "id": df.loc[buid, "cloze_hash"],
+                "deck": self.anki_deck_target,
+                "parent": f"#{buid}",
+            }
 
             if self.article_name_as_tag:
                 if "tags" in block.properties:
@@ -530,7 +553,7 @@ class omnivore_to_anki:
                     tags = []
                 assert article_name, "failed to parse article name"
                 tags.append(article_name)
-                cloze_block.set_property("tags", ",".join(tags))
+                cloze_props["tags"] = ",".join(tags)
 
             if empty_article:
                 if "tags" in block.properties:
@@ -538,7 +561,7 @@ class omnivore_to_anki:
                 else:
                     tags = []
                 tags.append("Empty_article")
-                cloze_block.set_property("tags", ",".join(tags))
+                cloze_props["tags"] = ",".join(tags)
 
             if self.prepend_tag:
                 if "tags" in block.properties:
@@ -549,7 +572,7 @@ class omnivore_to_anki:
                 tags.extend([self.prepend_tag + pl for pl in page_labels])
                 tags.extend([self.prepend_tag + pl for pl in json.loads(df.loc[buid, "block_labels"])])
                 if tags:
-                    cloze_block.set_property("tags", ",".join(tags))
+                    cloze_props["tags"] = ",".join(tags)
 
             if self.append_tag:
                 if "tags" in block.properties:
@@ -557,7 +580,9 @@ class omnivore_to_anki:
                     tags += self.append_tag
                 else:
                     tags = self.append_tag
-                cloze_block.set_property("tags", ",".join(tags))
+                cloze_props["tags"] = ",".join(tags)
+
+            cloze_block.set_properties(cloze_props)
 
             # add the cloze as block in the newpage
             newpage.blocks.append(cloze_block)
@@ -672,187 +697,6 @@ class omnivore_to_anki:
         return text
 
 
-def parse_date(path: Path) -> datetime:
-    "return the date property of a logseq page"
-    cont = path.read_text()
-    s = cont.split("date-saved:: ")[1].split("]]")[0][2:]
-    date = datetime.strptime(s, "%d-%m-%Y")
-    return date
-
-
-@mem.cache(ignore=["n_jobs"])
-def match_highlight_to_corpus(
-        query: str,
-        corpus: str,
-        case_sensitive: bool = True,
-        step_factor: int = 500,
-        n_jobs: int = -1,
-    ) -> List:
-    '''
-    Source: https://stackoverflow.com/questions/36013295/find-best-substring-match
-    Returns the substring of the corpus with the least Levenshtein distance from the query
-    (May not always return optimal answer).
-
-    Arguments
-    - query: str
-    - corpus: str
-    - case_sensitive: bool
-    - step_factor: int
-        Only used in the long way.
-        Influences the resolution of the thorough search once the general region is found.
-        The increment in ngrams lengths used for the thorough search is calculated as len(query)//step_factor.
-        Increasing this increases the number of ngram lengths used in the thorough search and increases the chances 
-        of getting the optimal solution at the cost of runtime and memory.
-    - n_jobs: int
-        number of jobs to use for multithreading. 1 to disable
-
-    Returns
-    [
-        List of best matching substrings of corpus,
-        Levenshtein ratio of closest match,
-        Levenshtein distance of closest match,
-        True if used the quick way False if using the long way,
-        ]
-    '''
-
-    # quick way
-    lq = len(query)
-    lc = len(corpus)
-    lquery = query.casefold()
-    lcorp = corpus.casefold()
-    # 1. find most probably region that contains the appropriate words
-    qwords = [w.strip() for w in set(lquery.casefold().split(" ")) if len(w.strip()) > 3]
-    indexes = []
-    for w in qwords:
-        m = []
-        prev = 0
-        while w in lcorp[prev:] and len(m) < 20:
-            m.append(prev + lcorp[prev:].index(w))
-            prev = m[-1] + 1
-        if len(m) > 20:
-            continue
-        if m:
-            indexes.append(m)
-    if indexes:
-        mins = [min(ind) for ind in indexes]
-        maxs = [max(ind) for ind in indexes]
-        mean_min = max(0, int(sum(mins) / len(mins)) - int(lq * 1.2))
-        mean_max = min(lc, int(sum(maxs) / len(maxs)) + int(lq * 1.2))
-        
-        mini_corp = corpus[mean_min:mean_max+1]
-
-        # 2. in the region, check the lev ratio in a sliding window
-        # to  determine best sub region
-        batches = [mini_corp[i*lq:(i+1)*lq] for i in range(0, len(mini_corp) // lq + 1)]
-        batches = [b for b in batches if b.strip()]
-        ratios = Parallel(
-            backend="threading",
-            n_jobs=n_jobs,
-        )(delayed(lev.ratio)(query, b) for b in batches)
-        max_rat = max(ratios)
-        max_rat_idx = [i for i,r in enumerate(ratios) if r == max_rat]
-
-        # 3. in the best sub region, find the best substring with a 1
-        # character sliding window using both ratio and distance
-        best_ratio = -inf
-        best_dist = inf
-        best_matches = []
-        def get_rat_dist(s1, s2):
-            return [lev.ratio(s1, s2), lev.distance(s1, s2)]
-        for idx in max_rat_idx:
-            iidx = mini_corp.index("".join(batches[idx-1:idx+1]))
-            area = mini_corp[iidx:iidx+3 * lq]
-            if not area.strip():
-                continue
-            batches2 = [area[i:lq+i] for i in range(0, len(area) + 1)]
-            ratdist2 = Parallel(
-                backend="threading",
-                n_jobs=n_jobs,
-            )(delayed(get_rat_dist)(query, b) for b in batches2)
-            ratios2 = [it[0] for it in ratdist2]
-            distances2 = [it[1] for it in ratdist2]
-            mr = max(ratios2)
-            md = min(distances2)
-            if mr >= best_ratio and md <= best_dist:
-                if mr == best_ratio and md == best_dist:
-                    best_matches.append(batches2[ratios2.index(best_ratio)])
-                else:
-                    best_ratio = mr
-                    best_dist = md
-                    best_matches = [batches2[ratios2.index(best_ratio)]]
-
-        if best_matches:
-            best_matches = list(set(best_matches))
-            return [best_matches, best_ratio, best_dist, True]
-
-
-    if not case_sensitive:
-        query = query.casefold()
-        corpus = corpus.casefold()
-
-    corpus_len = len(corpus)
-    query_len = len(query)
-    query_len_by_2 = max(query_len // 2, 1)
-    query_len_by_step_factor = max(query_len // step_factor, 1)
-
-    closest_match_idx = 0
-    min_dist = inf
-    # Intial search of corpus checks ngrams of the same length as the query
-    # Step is half the length of the query.
-    # This is found to be good enough to find the general region of the best match in the corpus
-    corpus_ngrams = [corpus[i:i+query_len] for i in range(0, corpus_len-query_len+1, query_len_by_2)]
-    dists = Parallel(
-        backend="threading",
-        n_jobs=n_jobs,
-    )(delayed(lev_dist)(ngram, query) for ngram in corpus_ngrams)
-    for idx, ngram in enumerate(corpus_ngrams):
-        ngram_dist = dists[idx]
-        if ngram_dist < min_dist:
-            min_dist = ngram_dist
-            closest_match_idx = idx
-
-    closest_match_idx = closest_match_idx * query_len_by_2
-    closest_match = corpus[closest_match_idx: closest_match_idx + query_len]
-    left = max(closest_match_idx - query_len_by_2 - 1, 0)
-    right = min((closest_match_idx+query_len-1) + query_len_by_2 + 2, corpus_len)
-    narrowed_corpus = corpus[left: right]
-    narrowed_corpus_len = len(narrowed_corpus)
-
-    # Once we have the general region of the best match we do a more thorough search in the region
-    # This is done by considering ngrams of various lengths in the region using a step of 1
-    ngram_lens = [l for l in range(narrowed_corpus_len, query_len_by_2 - 1, -query_len_by_step_factor)]
-    # Construct sets of ngrams where each set has ngrams of a particular length made over the region with a step of 1
-    narrowed_corpus_ngrams = [
-        [narrowed_corpus[i:i+ngram_len] for i in range(0, narrowed_corpus_len-ngram_len+1)]
-        for ngram_len in ngram_lens
-    ]
-
-    # Thorough search of the region in which the best match exists
-    def ld_set(ngram_set, query):
-        dists = []
-        for ngram in ngram_set:
-            dists.append(lev_dist(ngram, query))
-        return dists
-    dist_list = Parallel(
-        backend="threading",
-        n_jobs=n_jobs,
-    )(delayed(ld_set)(ngram_set, query) for ngram_set in narrowed_corpus_ngrams)
-
-    best_matches = []
-    for ing, ngram_set in enumerate(narrowed_corpus_ngrams):
-        for iing, ngram in enumerate(ngram_set):
-            ngram_dist = dist_list[ing][iing]
-            if ngram_dist == min_dist:
-                best_matches.append(ngram)
-            elif ngram_dist < min_dist:
-                min_dist = ngram_dist
-                best_matches = [ngram]
-
-    best_matches = list(set(best_matches))
-    assert len(best_matches) >= 1
-    best_ratio = max([lev_ratio(query, bm) for bm in best_matches])
-    return best_matches, best_ratio, min_dist, False
-
 @mem.cache()
 def download_pdf(url):
     "cached call to download a pdf from a url"
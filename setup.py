@@ -26,6 +26,8 @@ setup(
     ],
     extras_require={
         "beartype": ["beartype"],
+        "inotify": ["inotify_simple"],
+        "anchoring": ["rapidfuzz"],
     },
     python_requires=">=3.9",
     entry_points={
@@ -0,0 +1,25 @@
+import copy
+import pickle
+
+from LogseqMarkdownParser import LogseqBlock
+
+
+def test_pickle_and_deepcopy_after_reading_properties():
+    block = LogseqBlock("- text\n  color:: red")
+    assert block.properties["color"] == "red"
+    for clone in (pickle.loads(pickle.dumps(block)), copy.deepcopy(block)):
+        assert clone.content == block.content
+        assert dict(clone.properties) == {"color": "red"}
+        assert clone.UUID == block.UUID
+    assert pickle.loads(pickle.dumps(block.properties)) == {"color": "red"}
+
+
+def test_code_block_opened_on_the_first_line():
+    block = LogseqBlock("- ```yaml\n  name:: value\n  ```")
+    assert dict(block.properties) == {}
+    block.set_property("added", "x")
+    assert block.content == "- ```yaml\n  name:: value\n  ```\n  added:: x"
+    assert dict(block.properties) == {"added": "x"}
+
+    block = LogseqBlock("- ```\n  code\n  name:: value")
+    assert dict(block.properties) == {}
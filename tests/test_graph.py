@@ -0,0 +1,46 @@
+from LogseqMarkdownParser import LogseqGraph
+
+
+def make_graph(tmp_path, n_pages):
+    (tmp_path / "pages").mkdir()
+    for i in range(n_pages):
+        (tmp_path / "pages" / f"p{i}.md").write_text(f"- block {i}\n  - child {i}")
+    return LogseqGraph(tmp_path, lazy=True, max_pages=2)
+
+
+def test_saved_and_read_pages_can_be_evicted(tmp_path):
+    graph = make_graph(tmp_path, 5)
+    proxies = list(graph.pages.values())
+    for proxy in proxies:
+        proxy.blocks[0].content = "- edited"
+        proxy.export_to(proxy.path, overwrite=True)
+        str(proxy)  # the 2 spaces indentation must not make it dirty
+    assert graph.cache_stats["n_pages"] == 2
+    assert graph.cache_stats["evictions"] == 3
+    assert all(p.path.read_text().startswith("- edited") for p in proxies)
+
+
+def test_unsaved_pages_are_kept(tmp_path):
+    graph = make_graph(tmp_path, 3)
+    for proxy in graph.pages.values():
+        proxy.blocks[0].content = "- edited"
+    assert graph.cache_stats["n_pages"] == 3
+
+
+def test_malformed_page_does_not_abort_load(tmp_path):
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "pages" / "good.md").write_text("- fine")
+    (tmp_path / "pages" / "bad.md").write_text("not a block nor a property")
+    graph = LogseqGraph(tmp_path)
+    assert [p.name for p in graph.pages] == ["good.md"]
+    assert graph.load_stats["n_failed"] == 1
+    assert graph.load_stats["n_parsed"] == 1
+
+
+def test_deleted_files_are_skipped(tmp_path):
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "pages" / "a.md").write_text("- a")
+    graph = LogseqGraph(tmp_path, load=False, prefilter="- a")
+    graph.load(paths=[tmp_path / "pages" / "a.md", tmp_path / "pages" / "gone.md"])
+    assert len(graph.pages) == 1
+    assert graph.load_stats["n_skipped"] == 1
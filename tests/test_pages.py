@@ -0,0 +1,61 @@
+import pytest
+
+from LogseqMarkdownParser import LogseqBlock, LogseqPage, LogseqSharedGraph, append_blocks
+
+
+def test_append_blocks_with_mixed_root_levels(tmp_path):
+    page = LogseqPage("- TODO x\n\t- DONE a\n\t\t- a child\n- DONE b")
+    subtree = page.extract_subtree(page.blocks[1])
+    moved = subtree + page.extract_subtree(page.blocks[-1])
+    path = tmp_path / "done.md"
+    path.write_text("- old")
+    append_blocks(path, moved)
+    assert path.read_text() == "- old\n- DONE a\n\t- a child\n- DONE b"
+    # the blocks themselves are left as they were
+    assert [b.indentation_level for b in moved] == [4, 8, 0]
+
+
+def test_failed_transaction_restores_the_target_page():
+    page = LogseqPage("- a\n\t- a child\n- b")
+    other = LogseqPage("- c")
+    try:
+        with page.transaction():
+            page.move_subtree(page.blocks[0], target=other.blocks[0], target_page=other)
+            raise ValueError("abort")
+    except ValueError:
+        pass
+    assert page.content == "- a\n\t- a child\n- b"
+    assert other.content == "- c"
+
+
+def test_lossless_keeps_trailing_newline_when_last_block_is_edited(tmp_path):
+    source = "title:: t\n-  a  \n\t- b\n- c\n"
+    path = tmp_path / "page.md"
+    path.write_text(source)
+    page = LogseqPage(file_path=path, lossless=True)
+    page.blocks[-1].content = "- d"
+    page.export_to(path, overwrite=True)
+    assert path.read_bytes() == b"title:: t\n-  a  \n\t- b\n- d\n"
+
+
+def test_snapshot_and_shared_content_match_page_content(tmp_path):
+    source = "- a\n  - two spaces\n      - six spaces\n- b"
+    page = LogseqPage(source)
+    assert page.snapshot().content == page.content
+
+    (tmp_path / "pages").mkdir()
+    (tmp_path / "pages" / "p.md").write_text(source)
+    shared = LogseqSharedGraph.create(tmp_path)
+    try:
+        view = shared.get_page(shared.page_names()[0])
+        assert view.content == page.content
+    finally:
+        shared.close()
+        shared.unlink()
+
+
+def test_invalid_check_level_is_rejected():
+    with pytest.raises(AssertionError):
+        LogseqPage("- a", check_level="strict")
+    with pytest.raises(AssertionError):
+        LogseqBlock("- a", check_level="strict")